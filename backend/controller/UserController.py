@@ -293,7 +293,7 @@ def change_password():
             }), 404
         
         # 验证旧密码
-        if not user_repo._check_password(old_password, user['password_hash']):
+        if not user_repo._check_password(old_password, user_repo.get_password_hash(user_id)):
             db.close()
             return jsonify({
                 'success': False,
@@ -346,8 +346,7 @@ class AlertRepository:
             WHERE DATE(created_at) >= %s AND DATE(created_at) <= %s
             GROUP BY alert_level
         """
-        results = self.db.query(sql, (start_date, end_date))
-        return {r['alert_level']: r['count'] for r in results}
+        return dict(self.db.query_rows(sql, (start_date, end_date)))
     
     def _get_behavior_distribution(self, start_date: date, end_date: date) -> Dict[str, int]:
         """获取行为类型分布"""
@@ -358,8 +357,7 @@ class AlertRepository:
             GROUP BY behavior_type
             ORDER BY count DESC
         """
-        results = self.db.query(sql, (start_date, end_date))
-        return {r['behavior_type']: r['count'] for r in results}
+        return dict(self.db.query_rows(sql, (start_date, end_date)))
     
     def _get_time_series(self, start_date: date, end_date: date, period: str) -> List[Dict]:
         """获取时间序列数据"""
@@ -18,8 +18,16 @@ class DatabaseConfig:
     database: str = "classroom_behavior_db"
     pool_size: int = 5
     pool_recycle: int = 3600
+    # 连接池耗尽时等待空闲连接的最长时间（秒）
+    pool_timeout: float = 5.0
+    # 连接归还连接池时是否重置会话状态
+    # 关闭并同时开启 autocommit 后，点查询可复用服务端预处理语句
+    pool_reset_session: bool = True
     charset: str = "utf8mb4"
     autocommit: bool = False
+    # 只读副本地址，未配置时只读查询也使用主库
+    replica_host: Optional[str] = None
+    replica_port: Optional[int] = None
     
     # 连接超时设置
     connect_timeout: int = 10
@@ -36,6 +44,11 @@ class DatabaseConfig:
             password=os.getenv('DB_PASSWORD', '123456'),
             database=os.getenv('DB_NAME', 'classroom_behavior_db'),
             pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+            pool_reset_session=os.getenv('DB_POOL_RESET_SESSION', 'true').lower() == 'true',
+            autocommit=os.getenv('DB_AUTOCOMMIT', 'false').lower() == 'true',
+            replica_host=os.getenv('DB_REPLICA_HOST') or None,
+            replica_port=int(os.getenv('DB_REPLICA_PORT', '0')) or None,
         )
     
     @property
@@ -61,6 +74,16 @@ class DatabaseConfig:
         return {
             'pool_name': 'classroom_behavior_pool',
             'pool_size': self.pool_size,
-            'pool_reset_session': True,
+            'pool_reset_session': self.pool_reset_session,
             **self.to_dict()
         }
+    
+    def to_replica_pool_config(self) -> dict:
+        """转换为只读副本连接池配置"""
+        pool_config = self.to_pool_config()
+        pool_config.update(
+            pool_name='classroom_behavior_replica_pool',
+            host=self.replica_host,
+            port=self.replica_port or self.port,
+        )
+        return pool_config
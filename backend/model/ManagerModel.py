@@ -3,10 +3,12 @@
 Database manager model with connection pooling and transaction support
 """
 import logging
+import time
 from contextlib import contextmanager
-from typing import Any, Dict, List, Optional, Tuple, Generator
+from typing import Any, Dict, List, Optional, Tuple, Generator, Iterator
 import mysql.connector
 from mysql.connector import pooling, Error as MySQLError
+from mysql.connector.errors import PoolError
 from .ConfigModel import DatabaseConfig
 
 logger = logging.getLogger(__name__)
@@ -15,6 +17,26 @@ logger = logging.getLogger(__name__)
 class DatabaseManager:
     """数据库连接管理器"""
     
+    # execute_many 每批发送的最大行数，避免多行INSERT超过 max_allowed_packet
+    EXECUTE_MANY_CHUNK_SIZE = 1000
+    
+    # 常用筛选/排序组合的复合索引: (表名, 索引名, 索引列)
+    COMPOSITE_INDEXES = (
+        ('alert_rules', 'idx_rules_active_created', 'is_active, created_at DESC'),
+        ('alert_rules', 'idx_rules_active_type_behav',
+         'is_active, rule_type, behavior_type, alert_level, created_at DESC'),
+        ('students', 'idx_students_class_num', 'class_id, student_number'),
+        ('interventions', 'idx_interventions_alert_created', 'alert_id, created_at'),
+        ('users', 'idx_users_created_id', 'created_at DESC, user_id DESC'),
+        ('users', 'idx_users_role_created_id', 'role, created_at DESC, user_id DESC'),
+        ('role_permissions', 'idx_role_perm_allowed', 'role, is_allowed, permission_name'),
+    )
+    
+    # 全文索引 (表名, 索引名, 列)，使用ngram分词以支持子串与中文检索
+    FULLTEXT_INDEXES = (
+        ('users', 'ft_users_username_email', 'username, email'),
+    )
+    
     def __init__(self, config: DatabaseConfig = None):
         """
         初始化数据库管理器
@@ -24,6 +46,7 @@ class DatabaseManager:
         """
         self.config = config or DatabaseConfig()
         self._pool: Optional[pooling.MySQLConnectionPool] = None
+        self._replica_pool: Optional[pooling.MySQLConnectionPool] = None
         self._initialized = False
     
     def _create_pool(self) -> None:
@@ -63,18 +86,53 @@ class DatabaseManager:
         """
         从连接池获取连接
         
+        连接池耗尽时最多等待 config.pool_timeout 秒，复用已建立的连接，
+        避免每次调用都重新握手认证。
+        
         Returns:
             MySQL连接对象
         """
         if self._pool is None:
             self._create_pool()
+        return self._checkout(self._pool)
+    
+    def get_read_connection(self) -> mysql.connector.MySQLConnection:
+        """
+        获取只读查询连接
         
-        try:
-            conn = self._pool.get_connection()
-            return conn
-        except MySQLError as e:
-            logger.error(f"Failed to get connection from pool: {e}")
-            raise
+        配置了 replica_host 时从只读副本连接池获取，否则使用主库连接池。
+        
+        Returns:
+            MySQL连接对象
+        """
+        if not self.config.replica_host:
+            return self.get_connection()
+        
+        if self._replica_pool is None:
+            try:
+                self._replica_pool = pooling.MySQLConnectionPool(
+                    **self.config.to_replica_pool_config()
+                )
+                logger.info(f"Replica connection pool created: {self.config.replica_host}")
+            except MySQLError as e:
+                logger.error(f"Failed to create replica connection pool: {e}")
+                raise
+        return self._checkout(self._replica_pool)
+    
+    def _checkout(self, pool: pooling.MySQLConnectionPool) -> mysql.connector.MySQLConnection:
+        """从指定连接池取出连接，池耗尽时最多等待 config.pool_timeout 秒"""
+        deadline = time.monotonic() + self.config.pool_timeout
+        while True:
+            try:
+                return pool.get_connection()
+            except PoolError as e:
+                if time.monotonic() >= deadline:
+                    logger.error(f"Connection pool exhausted: {e}")
+                    raise
+                time.sleep(0.01)
+            except MySQLError as e:
+                logger.error(f"Failed to get connection from pool: {e}")
+                raise
     
     def release_connection(self, conn: mysql.connector.MySQLConnection) -> None:
         """
@@ -139,6 +197,33 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
     
+    def query_rows(self, sql: str, params: Tuple = None) -> List[Tuple]:
+        """
+        执行查询，结果行为元组
+        
+        不为每行构建字典，适合在仓库内部直接解包、聚合的查询；
+        需要按列名访问或返回给调用方时使用 query。
+        
+        Args:
+            sql: SQL查询语句
+            params: 参数元组
+            
+        Returns:
+            查询结果列表，每行为按SELECT列顺序排列的元组
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params or ())
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        except MySQLError as e:
+            logger.error(f"Query failed: {e}, SQL: {sql}")
+            raise
+        finally:
+            self.release_connection(conn)
+    
     def query_one(self, sql: str, params: Tuple = None) -> Optional[Dict[str, Any]]:
         """
         执行查询并返回单条结果
@@ -153,10 +238,155 @@ class DatabaseManager:
         results = self.query(sql, params)
         return results[0] if results else None
     
+    def query_ro(self, sql: str, params: Tuple = None) -> List[Dict[str, Any]]:
+        """
+        在只读副本上执行查询（未配置副本时使用主库）
+        
+        副本存在复制延迟，仅用于可容忍短暂滞后的列表、搜索类查询。
+        
+        Args:
+            sql: SQL查询语句
+            params: 参数元组
+            
+        Returns:
+            查询结果列表，每行为字典
+        """
+        conn = self.get_read_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params or ())
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        except MySQLError as e:
+            logger.error(f"Read-only query failed: {e}, SQL: {sql}")
+            raise
+        finally:
+            self.release_connection(conn)
+    
+    def query_one_ro(self, sql: str, params: Tuple = None) -> Optional[Dict[str, Any]]:
+        """
+        在只读副本上执行查询并返回单条结果
+        
+        Args:
+            sql: SQL查询语句
+            params: 参数元组
+            
+        Returns:
+            单条查询结果或None
+        """
+        results = self.query_ro(sql, params)
+        return results[0] if results else None
+    
+    def iter_query(self, sql: str, params: Tuple = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式执行查询，逐行返回结果
+        
+        使用非缓冲游标，结果行按需从服务器读取，不会一次性加载到内存。
+        连接在迭代结束（或迭代器被关闭）后归还连接池。
+        
+        Args:
+            sql: SQL查询语句
+            params: 参数元组
+            
+        Yields:
+            每行结果字典
+        """
+        conn = self.get_connection()
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(sql, params or ())
+            for row in cursor:
+                yield row
+        except MySQLError as e:
+            logger.error(f"Streaming query failed: {e}, SQL: {sql}")
+            raise
+        finally:
+            # 提前结束迭代时丢弃未读取的结果，避免连接带着未读数据归还
+            try:
+                if conn.unread_result:
+                    conn.consume_results()
+                if cursor is not None:
+                    cursor.close()
+            except MySQLError as e:
+                logger.warning(f"Error closing streaming cursor: {e}")
+            self.release_connection(conn)
+    
+    def query_one_prepared(self, sql: str, params: Tuple = None) -> Optional[Dict[str, Any]]:
+        """
+        使用服务端预处理语句执行单行查询
+        
+        同一连接上相同的SQL只PREPARE一次，之后仅发送EXECUTE。归还连接时
+        重置会话会释放预处理语句，且非自动提交模式下复用连接会保留旧的读快照，
+        因此仅在 pool_reset_session=False 且 autocommit=True 时启用，
+        否则退化为 query_one。
+        
+        Args:
+            sql: SQL查询语句
+            params: 参数元组
+            
+        Returns:
+            单条查询结果或None
+        """
+        if self.config.pool_reset_session or not self.config.autocommit:
+            return self.query_one(sql, params)
+        
+        conn = self.get_connection()
+        try:
+            try:
+                cursor = self._get_prepared_cursor(conn, sql)
+                cursor.execute(sql, params or ())
+            except MySQLError:
+                # 连接重连后语句句柄失效，重新预处理一次
+                self._drop_prepared_cursor(conn, sql)
+                cursor = self._get_prepared_cursor(conn, sql)
+                cursor.execute(sql, params or ())
+            rows = cursor.fetchall()
+            if not rows:
+                return None
+            return dict(zip(cursor.column_names, rows[0]))
+        except MySQLError as e:
+            self._drop_prepared_cursor(conn, sql)
+            logger.error(f"Prepared query failed: {e}, SQL: {sql}")
+            raise
+        finally:
+            self.release_connection(conn)
+    
+    @staticmethod
+    def _get_prepared_cursor(conn, sql: str):
+        """获取（或创建）底层物理连接上缓存的预处理游标"""
+        raw = getattr(conn, '_cnx', conn)
+        cursors = getattr(raw, '_prepared_cursors', None)
+        if cursors is None:
+            cursors = {}
+            setattr(raw, '_prepared_cursors', cursors)
+        cursor = cursors.get(sql)
+        if cursor is None:
+            cursor = raw.cursor(prepared=True)
+            cursors[sql] = cursor
+        return cursor
+    
+    @staticmethod
+    def _drop_prepared_cursor(conn, sql: str) -> None:
+        """丢弃失效的预处理游标"""
+        raw = getattr(conn, '_cnx', conn)
+        cursors = getattr(raw, '_prepared_cursors', None)
+        if cursors:
+            cursor = cursors.pop(sql, None)
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except MySQLError:
+                    pass
+    
     def execute_many(self, sql: str, params_list: List[Tuple]) -> int:
         """
         批量执行SQL语句
         
+        INSERT语句会被驱动改写为多行VALUES；参数按 EXECUTE_MANY_CHUNK_SIZE
+        分批发送，所有批次在同一事务中提交。
+        
         Args:
             sql: SQL语句
             params_list: 参数列表
@@ -167,12 +397,15 @@ class DatabaseManager:
         if not params_list:
             return 0
         
+        chunk_size = self.EXECUTE_MANY_CHUNK_SIZE
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.executemany(sql, params_list)
+            affected = 0
+            for start in range(0, len(params_list), chunk_size):
+                cursor.executemany(sql, params_list[start:start + chunk_size])
+                affected += cursor.rowcount
             conn.commit()
-            affected = cursor.rowcount
             cursor.close()
             return affected
         except MySQLError as e:
@@ -243,6 +476,10 @@ class DatabaseManager:
         
         # 创建所有表
         self._create_tables()
+        # 创建复合索引
+        self._create_indexes()
+        # 创建干预有效性汇总表
+        self._create_intervention_summary()
         # 插入默认权限配置
         self._init_default_permissions()
         
@@ -497,6 +734,191 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
     
+    def _create_indexes(self) -> None:
+        """创建复合索引与全文索引（已存在的跳过；表或列不存在时记录警告）"""
+        indexes = [
+            (table, index_name, f"CREATE INDEX {index_name} ON {table} ({columns})")
+            for table, index_name, columns in self.COMPOSITE_INDEXES
+        ]
+        indexes.extend(
+            (table, index_name,
+             f"CREATE FULLTEXT INDEX {index_name} ON {table} ({columns}) WITH PARSER ngram")
+            for table, index_name, columns in self.FULLTEXT_INDEXES
+        )
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            for table, index_name, ddl in indexes:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM information_schema.STATISTICS
+                    WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+                """, (table, index_name))
+                if cursor.fetchone()[0]:
+                    continue
+                try:
+                    cursor.execute(ddl)
+                    logger.info(f"Index created: {table}.{index_name}")
+                except MySQLError as e:
+                    logger.warning(f"Skipped index {table}.{index_name}: {e}")
+            cursor.close()
+        finally:
+            self.release_connection(conn)
+    
+    def _create_intervention_summary(self) -> None:
+        """
+        创建干预有效性汇总表及其增量维护触发器
+        
+        汇总表按 (action_taken, behavior_type) 记录评分次数与评分总和，
+        interventions 的增删改由触发器同步；删除 alerts 时由 alerts 上的
+        触发器扣除其干预记录（外键级联删除不会触发 interventions 的触发器）。
+        
+        触发器已全部存在时不做任何修改；只有新建触发器后才全量重建汇总表。
+        创建失败（如开启binlog时缺少 SUPER 权限）只记录警告并移除汇总表，
+        读取方回退为实时聚合。
+        """
+        trigger_names = ('trg_interventions_ai', 'trg_interventions_au',
+                         'trg_interventions_ad', 'trg_alerts_bd')
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.TABLES
+                WHERE table_schema = DATABASE() AND table_name IN ('interventions', 'alerts')
+            """)
+            if cursor.fetchone()[0] < 2:
+                cursor.close()
+                logger.warning("Tables interventions/alerts not found, skipped intervention summary")
+                return
+            
+            placeholders = ', '.join(['%s'] * len(trigger_names))
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM information_schema.TRIGGERS
+                WHERE trigger_schema = DATABASE() AND trigger_name IN ({placeholders})
+            """, trigger_names)
+            if cursor.fetchone()[0] == len(trigger_names):
+                cursor.close()
+                return
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS intervention_effectiveness (
+                    action_taken VARCHAR(255) NOT NULL DEFAULT '',
+                    behavior_type VARCHAR(50) NOT NULL,
+                    rating_count INT NOT NULL DEFAULT 0,
+                    rating_sum INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (action_taken, behavior_type),
+                    INDEX idx_behavior (behavior_type)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            
+            add_new = """
+                IF NEW.effectiveness_rating IS NOT NULL THEN
+                    INSERT INTO intervention_effectiveness
+                        (action_taken, behavior_type, rating_count, rating_sum)
+                    SELECT COALESCE(NEW.action_taken, ''), a.behavior_type, 1, NEW.effectiveness_rating
+                    FROM alerts a WHERE a.alert_id = NEW.alert_id
+                    ON DUPLICATE KEY UPDATE
+                        rating_count = rating_count + 1,
+                        rating_sum = rating_sum + NEW.effectiveness_rating;
+                END IF;
+            """
+            remove_old = """
+                IF OLD.effectiveness_rating IS NOT NULL THEN
+                    UPDATE intervention_effectiveness e
+                    JOIN alerts a ON a.alert_id = OLD.alert_id
+                    SET e.rating_count = e.rating_count - 1,
+                        e.rating_sum = e.rating_sum - OLD.effectiveness_rating
+                    WHERE e.action_taken = COALESCE(OLD.action_taken, '')
+                      AND e.behavior_type = a.behavior_type;
+                END IF;
+            """
+            triggers = {
+                'trg_interventions_ai': f"""
+                    CREATE TRIGGER trg_interventions_ai AFTER INSERT ON interventions
+                    FOR EACH ROW
+                    BEGIN
+                        {add_new}
+                    END
+                """,
+                'trg_interventions_au': f"""
+                    CREATE TRIGGER trg_interventions_au AFTER UPDATE ON interventions
+                    FOR EACH ROW
+                    BEGIN
+                        {remove_old}
+                        {add_new}
+                    END
+                """,
+                'trg_interventions_ad': f"""
+                    CREATE TRIGGER trg_interventions_ad AFTER DELETE ON interventions
+                    FOR EACH ROW
+                    BEGIN
+                        {remove_old}
+                    END
+                """,
+                'trg_alerts_bd': """
+                    CREATE TRIGGER trg_alerts_bd BEFORE DELETE ON alerts
+                    FOR EACH ROW
+                        UPDATE intervention_effectiveness e
+                        JOIN (
+                            SELECT COALESCE(action_taken, '') AS action_taken,
+                                   COUNT(*) AS cnt,
+                                   SUM(effectiveness_rating) AS total
+                            FROM interventions
+                            WHERE alert_id = OLD.alert_id AND effectiveness_rating IS NOT NULL
+                            GROUP BY COALESCE(action_taken, '')
+                        ) i ON e.action_taken = i.action_taken
+                        SET e.rating_count = e.rating_count - i.cnt,
+                            e.rating_sum = e.rating_sum - i.total
+                        WHERE e.behavior_type = OLD.behavior_type
+                """,
+            }
+            for name, ddl in triggers.items():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(ddl)
+            
+            conn.commit()
+            cursor.close()
+            
+        except MySQLError as e:
+            conn.rollback()
+            logger.warning(f"Skipped intervention summary: {e}")
+            self._drop_intervention_summary(conn, trigger_names)
+            return
+        finally:
+            self.release_connection(conn)
+        
+        self.rebuild_intervention_summary()
+    
+    @staticmethod
+    def _drop_intervention_summary(conn, trigger_names) -> None:
+        """移除部分创建的触发器与汇总表，避免触发器写入缺失的表或汇总数据不再更新"""
+        try:
+            cursor = conn.cursor()
+            for name in trigger_names:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute("DROP TABLE IF EXISTS intervention_effectiveness")
+            cursor.close()
+        except MySQLError as e:
+            logger.warning(f"Failed to clean up intervention summary: {e}")
+    
+    def rebuild_intervention_summary(self) -> None:
+        """按 interventions 全量重建干预有效性汇总表（用于校准汇总数据）"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM intervention_effectiveness")
+            cursor.execute("""
+                INSERT INTO intervention_effectiveness
+                    (action_taken, behavior_type, rating_count, rating_sum)
+                SELECT COALESCE(i.action_taken, ''), a.behavior_type,
+                       COUNT(*), SUM(i.effectiveness_rating)
+                FROM interventions i
+                JOIN alerts a ON i.alert_id = a.alert_id
+                WHERE i.effectiveness_rating IS NOT NULL
+                GROUP BY COALESCE(i.action_taken, ''), a.behavior_type
+            """)
+            cursor.close()
+        logger.info("Intervention summary rebuilt")
+    
     def _init_default_permissions(self) -> None:
         """初始化默认权限配置"""
         permissions = [
@@ -539,6 +961,7 @@ class DatabaseManager:
     
     def close(self) -> None:
         """关闭所有连接"""
+        self._replica_pool = None
         if self._pool:
             # MySQL Connector的连接池没有显式的close方法
             # 连接会在垃圾回收时自动关闭
@@ -2,18 +2,80 @@
 预警规则数据仓库模块
 Alert rule data repository
 """
+import copy
 import json
 import logging
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from mysql.connector import errorcode, Error as MySQLError
+from backend.model.CacheModel import TTLCache
 from backend.model.ManagerModel import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+# 规则查询缓存有效期（秒），规则变更时会主动失效
+_RULE_CACHE_TTL = 10.0
+
+# 以下缓存在进程内所有 RuleRepository 实例间共享，
+# 任一实例写入规则或通知偏好后，其他实例读取时即可看到变更
+# 按规则名称的点查询缓存（规则变更时清空）
+_rule_by_name_cache = TTLCache(maxsize=4096, ttl=60.0)
+# 激活规则缓存: 固定键 -> 已解析的规则列表
+_active_rules_cache = TTLCache(maxsize=1, ttl=_RULE_CACHE_TTL)
+# 列表查询缓存: 筛选参数 -> 已解析的规则列表
+_rule_list_cache = TTLCache(maxsize=128, ttl=_RULE_CACHE_TTL)
+# 通知偏好缓存: user_id -> (level_0, level_1, level_2, level_3)
+_notify_bits_cache = TTLCache(maxsize=4096, ttl=_RULE_CACHE_TTL)
+
+# 优先使用orjson（C实现）处理规则条件JSON，未安装时回退到标准库
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    _json_loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+else:
+    _json_loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+    _json_dumps = json.dumps
+
 
 class RuleRepository:
     """预警规则数据访问层"""
     
+    # 未设置通知偏好时的默认值：级别1及以上通知
+    _DEFAULT_NOTIFY_BITS = (False, True, True, True)
+    # 各预警级别对应的通知偏好列（下标即预警级别）
+    _NOTIFY_LEVEL_COLS = ('alert_level_0', 'alert_level_1', 'alert_level_2', 'alert_level_3')
+    # update_rule 可更新的列及其中的JSON列
+    _RULE_COLS = (
+        'rule_name', 'rule_type', 'description', 'conditions', 'alert_level',
+        'behavior_type', 'class_id', 'threshold_count', 'time_window_seconds',
+        'is_active'
+    )
+    _JSON_COLS = frozenset({'conditions'})
+    # update_intervention 可更新的列
+    _INTERVENTION_COLS = ('outcome', 'effectiveness_rating')
+    # 高频点查询（使用服务端预处理语句）
+    _GET_RULE_SQL = "SELECT * FROM alert_rules WHERE rule_id = %s"
+    _GET_INTERVENTION_SQL = "SELECT * FROM interventions WHERE intervention_id = %s"
+    _GET_PREFERENCES_SQL = "SELECT * FROM notification_preferences WHERE user_id = %s"
+    # 无筛选条件时的固定查询
+    _LIST_RULES_ALL_SQL = (
+        "SELECT * FROM alert_rules ORDER BY created_at DESC LIMIT %s OFFSET %s"
+    )
+    _COUNT_RULES_ALL_SQL = "SELECT COUNT(*) as count FROM alert_rules"
+    _GET_NOTIFY_BITS_SQL = (
+        "SELECT alert_level_0, alert_level_1, alert_level_2, alert_level_3 "
+        "FROM notification_preferences WHERE user_id = %s"
+    )
+    
     def __init__(self, db: DatabaseManager):
         """
         初始化规则数据仓库
@@ -22,6 +84,8 @@ class RuleRepository:
             db: 数据库管理器实例
         """
         self.db = db
+        # 干预有效性汇总表是否可用（未执行 init_database 时不存在）
+        self._summary_available = True
     
     # ==================== Rule CRUD 操作 ====================
     
@@ -65,11 +129,11 @@ class RuleRepository:
              created_by, is_active)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        return self.db.insert_and_get_id(sql, (
+        rule_id = self.db.insert_and_get_id(sql, (
             rule_name,
             rule_type,
             description,
-            json.dumps(conditions) if isinstance(conditions, dict) else conditions,
+            _json_dumps(conditions) if isinstance(conditions, dict) else conditions,
             alert_level,
             behavior_type,
             class_id,
@@ -78,6 +142,61 @@ class RuleRepository:
             created_by,
             is_active
         ))
+        self.invalidate_cache()
+        return rule_id
+    
+    def create_rules_batch(self, rules: List[Dict[str, Any]]) -> int:
+        """
+        批量创建预警规则
+        
+        Args:
+            rules: 规则列表，每个规则包含 rule_name, rule_type, conditions 及
+                   create_rule 的其余可选字段
+            
+        Returns:
+            插入的规则数
+        """
+        if not rules:
+            return 0
+        
+        sql = """
+            INSERT INTO alert_rules 
+            (rule_name, rule_type, description, conditions, alert_level, 
+             behavior_type, class_id, threshold_count, time_window_seconds,
+             created_by, is_active)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        # 批量导入常复用同一个条件对象，同一批次内按对象身份只序列化一次
+        # （批次执行期间对象均存活且不会被修改，id不会被复用）
+        serialized: Dict[int, str] = {}
+        
+        def dump_conditions(conditions: Any) -> Any:
+            if not isinstance(conditions, dict):
+                return conditions
+            text = serialized.get(id(conditions))
+            if text is None:
+                text = serialized[id(conditions)] = _json_dumps(conditions)
+            return text
+        
+        params_list = [
+            (
+                r['rule_name'],
+                r['rule_type'],
+                r.get('description'),
+                dump_conditions(r['conditions']),
+                r.get('alert_level', 1),
+                r.get('behavior_type'),
+                r.get('class_id'),
+                r.get('threshold_count', 1),
+                r.get('time_window_seconds', 60),
+                r.get('created_by'),
+                r.get('is_active', True)
+            )
+            for r in rules
+        ]
+        count = self.db.execute_many(sql, params_list)
+        self.invalidate_cache()
+        return count
     
     def update_rule(
         self,
@@ -98,41 +217,31 @@ class RuleRepository:
         
         Args:
             rule_id: 规则ID
-            其他参数: 要更新的字段
-        """
+            其他参数: 要更新的字段，值为None的字段不更新
+        """
+        fields = {
+            'rule_name': rule_name,
+            'rule_type': rule_type,
+            'description': description,
+            'conditions': conditions,
+            'alert_level': alert_level,
+            'behavior_type': behavior_type,
+            'class_id': class_id,
+            'threshold_count': threshold_count,
+            'time_window_seconds': time_window_seconds,
+            'is_active': is_active,
+        }
         updates = []
         params = []
         
-        if rule_name is not None:
-            updates.append("rule_name = %s")
-            params.append(rule_name)
-        if rule_type is not None:
-            updates.append("rule_type = %s")
-            params.append(rule_type)
-        if conditions is not None:
-            updates.append("conditions = %s")
-            params.append(json.dumps(conditions) if isinstance(conditions, dict) else conditions)
-        if alert_level is not None:
-            updates.append("alert_level = %s")
-            params.append(alert_level)
-        if description is not None:
-            updates.append("description = %s")
-            params.append(description)
-        if behavior_type is not None:
-            updates.append("behavior_type = %s")
-            params.append(behavior_type)
-        if class_id is not None:
-            updates.append("class_id = %s")
-            params.append(class_id)
-        if threshold_count is not None:
-            updates.append("threshold_count = %s")
-            params.append(threshold_count)
-        if time_window_seconds is not None:
-            updates.append("time_window_seconds = %s")
-            params.append(time_window_seconds)
-        if is_active is not None:
-            updates.append("is_active = %s")
-            params.append(is_active)
+        for col in self._RULE_COLS:
+            value = fields[col]
+            if value is None:
+                continue
+            if col in self._JSON_COLS and isinstance(value, dict):
+                value = _json_dumps(value)
+            updates.append(f"{col} = %s")
+            params.append(value)
         
         if not updates:
             return
@@ -140,6 +249,7 @@ class RuleRepository:
         params.append(rule_id)
         sql = f"UPDATE alert_rules SET {', '.join(updates)} WHERE rule_id = %s"
         self.db.execute(sql, tuple(params))
+        self.invalidate_cache()
     
     def get_rule(self, rule_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -151,8 +261,7 @@ class RuleRepository:
         Returns:
             规则信息字典或None
         """
-        sql = "SELECT * FROM alert_rules WHERE rule_id = %s"
-        result = self.db.query_one(sql, (rule_id,))
+        result = self.db.query_one_prepared(self._GET_RULE_SQL, (rule_id,))
         if result:
             result = self._parse_rule_json_fields(result)
         return result
@@ -167,10 +276,15 @@ class RuleRepository:
         Returns:
             规则信息字典或None
         """
+        cached = _rule_by_name_cache.get(rule_name)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
         sql = "SELECT * FROM alert_rules WHERE rule_name = %s"
         result = self.db.query_one(sql, (rule_name,))
         if result:
             result = self._parse_rule_json_fields(result)
+            _rule_by_name_cache.set(rule_name, copy.deepcopy(result))
         return result
     
     def list_rules(
@@ -198,6 +312,93 @@ class RuleRepository:
         Returns:
             规则列表
         """
+        cache_key = frozenset((
+            ('is_active', is_active),
+            ('rule_type', rule_type),
+            ('behavior_type', behavior_type),
+            ('alert_level', alert_level),
+            ('created_by', created_by),
+            ('limit', limit),
+            ('offset', offset),
+        ))
+        cached = _rule_list_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        if (is_active is None and not rule_type and not behavior_type
+                and alert_level is None and created_by is None):
+            # 无筛选条件时直接使用固定SQL
+            rules = self.db.query(self._LIST_RULES_ALL_SQL, (limit, offset))
+        else:
+            where_clause, params = self._build_rule_filters(
+                is_active, rule_type, behavior_type, alert_level, created_by
+            )
+            sql = f"""
+                SELECT * FROM alert_rules 
+                {where_clause}
+                ORDER BY created_at DESC
+                LIMIT %s OFFSET %s
+            """
+            params.extend([limit, offset])
+            rules = self.db.query(sql, tuple(params))
+        for r in rules:
+            c = r.get('conditions')
+            if c and type(c) is str:
+                try:
+                    r['conditions'] = _json_loads(c)
+                except _JSONDecodeError:
+                    pass
+        
+        _rule_list_cache.set(cache_key, rules)
+        return copy.deepcopy(rules)
+    
+    def iter_rules(
+        self,
+        is_active: bool = None,
+        rule_type: str = None,
+        behavior_type: str = None,
+        alert_level: int = None,
+        created_by: int = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式遍历规则（不分页、不缓存），适合全量导出等大结果集场景
+        
+        Args:
+            is_active: 是否激活筛选
+            rule_type: 规则类型筛选
+            behavior_type: 行为类型筛选
+            alert_level: 预警级别筛选
+            created_by: 创建者筛选
+            
+        Yields:
+            规则信息字典
+        """
+        where_clause, params = self._build_rule_filters(
+            is_active, rule_type, behavior_type, alert_level, created_by
+        )
+        sql = f"""
+            SELECT * FROM alert_rules 
+            {where_clause}
+            ORDER BY created_at DESC
+        """
+        for r in self.db.iter_query(sql, tuple(params)):
+            c = r.get('conditions')
+            if c and type(c) is str:
+                try:
+                    r['conditions'] = _json_loads(c)
+                except _JSONDecodeError:
+                    pass
+            yield r
+    
+    @staticmethod
+    def _build_rule_filters(
+        is_active: bool = None,
+        rule_type: str = None,
+        behavior_type: str = None,
+        alert_level: int = None,
+        created_by: int = None
+    ) -> Tuple[str, List[Any]]:
+        """构建规则查询的WHERE子句及参数"""
         conditions = []
         params = []
         
@@ -218,24 +419,24 @@ class RuleRepository:
             params.append(created_by)
         
         where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
-        sql = f"""
-            SELECT * FROM alert_rules 
-            {where_clause}
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
-        """
-        params.extend([limit, offset])
-        results = self.db.query(sql, tuple(params))
-        return [self._parse_rule_json_fields(r) for r in results]
+        return where_clause, params
     
     def get_active_rules(self) -> List[Dict[str, Any]]:
         """
         获取所有激活的规则
         
+        结果在进程内缓存 _RULE_CACHE_TTL 秒，规则变更时自动失效。
+        
         Returns:
             激活的规则列表
         """
-        return self.list_rules(is_active=True, limit=1000)
+        cached = _active_rules_cache.get('active')
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        rules = self.list_rules(is_active=True, limit=1000)
+        _active_rules_cache.set('active', rules)
+        return copy.deepcopy(rules)
     
     def count_rules(
         self,
@@ -248,17 +449,11 @@ class RuleRepository:
         Returns:
             规则数量
         """
-        conditions = []
-        params = []
+        if is_active is None and not rule_type:
+            result = self.db.query_one(self._COUNT_RULES_ALL_SQL)
+            return result['count'] if result else 0
         
-        if is_active is not None:
-            conditions.append("is_active = %s")
-            params.append(is_active)
-        if rule_type:
-            conditions.append("rule_type = %s")
-            params.append(rule_type)
-        
-        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        where_clause, params = self._build_rule_filters(is_active, rule_type)
         sql = f"SELECT COUNT(*) as count FROM alert_rules {where_clause}"
         result = self.db.query_one(sql, tuple(params))
         return result['count'] if result else 0
@@ -272,23 +467,32 @@ class RuleRepository:
         """
         sql = "DELETE FROM alert_rules WHERE rule_id = %s"
         self.db.execute(sql, (rule_id,))
+        self.invalidate_cache()
     
     def activate_rule(self, rule_id: int) -> None:
         """激活规则"""
         sql = "UPDATE alert_rules SET is_active = TRUE WHERE rule_id = %s"
         self.db.execute(sql, (rule_id,))
+        self.invalidate_cache()
     
     def deactivate_rule(self, rule_id: int) -> None:
         """停用规则"""
         sql = "UPDATE alert_rules SET is_active = FALSE WHERE rule_id = %s"
         self.db.execute(sql, (rule_id,))
+        self.invalidate_cache()
+    
+    def invalidate_cache(self) -> None:
+        """清空规则查询缓存（规则变更后调用）"""
+        _active_rules_cache.clear()
+        _rule_list_cache.clear()
+        _rule_by_name_cache.clear()
     
     def _parse_rule_json_fields(self, rule: Dict) -> Dict:
         """解析规则中的JSON字段"""
         if rule.get('conditions') and isinstance(rule['conditions'], str):
             try:
-                rule['conditions'] = json.loads(rule['conditions'])
-            except json.JSONDecodeError:
+                rule['conditions'] = _json_loads(rule['conditions'])
+            except _JSONDecodeError:
                 pass
         return rule
     
@@ -342,15 +546,9 @@ class RuleRepository:
             outcome: 干预结果
             effectiveness_rating: 有效性评分
         """
-        updates = []
-        params = []
-        
-        if outcome is not None:
-            updates.append("outcome = %s")
-            params.append(outcome)
-        if effectiveness_rating is not None:
-            updates.append("effectiveness_rating = %s")
-            params.append(effectiveness_rating)
+        values = (outcome, effectiveness_rating)
+        updates = [f"{col} = %s" for col, v in zip(self._INTERVENTION_COLS, values) if v is not None]
+        params = [v for v in values if v is not None]
         
         if not updates:
             return
@@ -361,8 +559,7 @@ class RuleRepository:
     
     def get_intervention(self, intervention_id: int) -> Optional[Dict[str, Any]]:
         """获取干预记录"""
-        sql = "SELECT * FROM interventions WHERE intervention_id = %s"
-        return self.db.query_one(sql, (intervention_id,))
+        return self.db.query_one_prepared(self._GET_INTERVENTION_SQL, (intervention_id,))
     
     def get_interventions_by_alert(self, alert_id: int) -> List[Dict[str, Any]]:
         """获取预警的所有干预记录"""
@@ -373,12 +570,24 @@ class RuleRepository:
         """
         获取干预有效性统计
         
+        优先读取触发器维护的 intervention_effectiveness 汇总表，
+        汇总表不存在时回退为实时聚合。
+        
         Args:
             behavior_type: 可选的行为类型筛选
             
         Returns:
             干预有效性统计列表
         """
+        if self._summary_available:
+            try:
+                return self._get_effectiveness_from_summary(behavior_type)
+            except MySQLError as e:
+                if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                    raise
+                logger.warning("intervention_effectiveness not found, falling back to aggregation")
+                self._summary_available = False
+        
         if behavior_type:
             sql = """
                 SELECT i.action_taken, 
@@ -403,6 +612,30 @@ class RuleRepository:
             """
             return self.db.query(sql)
     
+    def _get_effectiveness_from_summary(self, behavior_type: str = None) -> List[Dict[str, Any]]:
+        """从触发器维护的汇总表读取干预有效性统计"""
+        if behavior_type:
+            sql = """
+                SELECT NULLIF(action_taken, '') as action_taken,
+                       rating_count as count,
+                       rating_sum / rating_count as avg_effectiveness
+                FROM intervention_effectiveness
+                WHERE behavior_type = %s AND rating_count > 0
+                ORDER BY avg_effectiveness DESC
+            """
+            return self.db.query(sql, (behavior_type,))
+        else:
+            sql = """
+                SELECT NULLIF(action_taken, '') as action_taken,
+                       SUM(rating_count) as count,
+                       SUM(rating_sum) / SUM(rating_count) as avg_effectiveness
+                FROM intervention_effectiveness
+                GROUP BY action_taken
+                HAVING SUM(rating_count) > 0
+                ORDER BY avg_effectiveness DESC
+            """
+            return self.db.query(sql)
+    
     # ==================== Notification Preferences 操作 ====================
     
     def get_notification_preferences(self, user_id: int) -> Optional[Dict[str, Any]]:
@@ -415,8 +648,7 @@ class RuleRepository:
         Returns:
             通知偏好字典或None
         """
-        sql = "SELECT * FROM notification_preferences WHERE user_id = %s"
-        return self.db.query_one(sql, (user_id,))
+        return self.db.query_one_prepared(self._GET_PREFERENCES_SQL, (user_id,))
     
     def create_or_update_notification_preferences(
         self,
@@ -441,31 +673,25 @@ class RuleRepository:
         Returns:
             preference_id
         """
-        # 检查是否已存在
-        existing = self.get_notification_preferences(user_id)
-        
-        if existing:
-            sql = """
-                UPDATE notification_preferences 
-                SET alert_level_0 = %s, alert_level_1 = %s, alert_level_2 = %s,
-                    alert_level_3 = %s, sound_enabled = %s
-                WHERE user_id = %s
-            """
-            self.db.execute(sql, (
-                alert_level_0, alert_level_1, alert_level_2,
-                alert_level_3, sound_enabled, user_id
-            ))
-            return existing['preference_id']
-        else:
-            sql = """
-                INSERT INTO notification_preferences 
-                (user_id, alert_level_0, alert_level_1, alert_level_2, alert_level_3, sound_enabled)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            return self.db.insert_and_get_id(sql, (
-                user_id, alert_level_0, alert_level_1, alert_level_2,
-                alert_level_3, sound_enabled
-            ))
+        # 单条UPSERT完成创建或更新；LAST_INSERT_ID(preference_id) 使更新时也能返回已有ID
+        sql = """
+            INSERT INTO notification_preferences 
+            (user_id, alert_level_0, alert_level_1, alert_level_2, alert_level_3, sound_enabled)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                preference_id = LAST_INSERT_ID(preference_id),
+                alert_level_0 = VALUES(alert_level_0),
+                alert_level_1 = VALUES(alert_level_1),
+                alert_level_2 = VALUES(alert_level_2),
+                alert_level_3 = VALUES(alert_level_3),
+                sound_enabled = VALUES(sound_enabled)
+        """
+        preference_id = self.db.insert_and_get_id(sql, (
+            user_id, alert_level_0, alert_level_1, alert_level_2,
+            alert_level_3, sound_enabled
+        ))
+        self.refresh_preferences(user_id)
+        return preference_id
     
     def should_notify(self, user_id: int, alert_level: int) -> bool:
         """
@@ -478,10 +704,39 @@ class RuleRepository:
         Returns:
             是否应该通知
         """
-        prefs = self.get_notification_preferences(user_id)
-        if not prefs:
-            # 默认：级别1及以上通知
-            return alert_level >= 1
+        bits = self.get_notification_bits(user_id)
+        if 0 <= alert_level < len(bits):
+            return bits[alert_level]
+        return alert_level >= 1
+    
+    def refresh_preferences(self, user_id: int) -> None:
+        """
+        使指定用户的通知偏好缓存失效
+        
+        Args:
+            user_id: 用户ID
+        """
+        _notify_bits_cache.pop(user_id)
+    
+    def get_notification_bits(self, user_id: int) -> Tuple[bool, ...]:
+        """
+        获取用户各预警级别的通知开关（带缓存）
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            按预警级别 0-3 排列的通知开关元组，未设置偏好时返回默认值
+        """
+        bits = _notify_bits_cache.get(user_id)
+        if bits is not None:
+            return bits
+        
+        row = self.db.query_one_prepared(self._GET_NOTIFY_BITS_SQL, (user_id,))
+        if row:
+            bits = tuple(bool(row[col]) for col in self._NOTIFY_LEVEL_COLS)
+        else:
+            bits = self._DEFAULT_NOTIFY_BITS
         
-        level_key = f'alert_level_{alert_level}'
-        return prefs.get(level_key, alert_level >= 1)
+        _notify_bits_cache.set(user_id, bits)
+        return bits
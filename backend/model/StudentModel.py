@@ -3,15 +3,28 @@
 Student repository for student profile management
 """
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from backend.model.CacheModel import TTLCache
 from backend.model.ManagerModel import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+# 按学号的点查询缓存（进程内共享，学生数据变更时清空）
+_student_by_number_cache = TTLCache(maxsize=4096, ttl=60.0)
+
 
 class StudentRepository:
     """学生数据访问层"""
     
+    # update_student 允许更新的字段
+    _UPDATABLE_FIELDS = frozenset({'name', 'class_id', 'gender', 'enrollment_year'})
+    # 高频点查询（使用服务端预处理语句）
+    _GET_STUDENT_SQL = "SELECT * FROM students WHERE student_id = %s"
+    _GET_STUDENT_BY_NUMBER_SQL = "SELECT * FROM students WHERE student_number = %s"
+    # 无筛选条件时的固定查询
+    _LIST_STUDENTS_ALL_SQL = "SELECT * FROM students ORDER BY student_number LIMIT %s OFFSET %s"
+    _COUNT_STUDENTS_ALL_SQL = "SELECT COUNT(*) as count FROM students"
+    
     def __init__(self, db: DatabaseManager):
         """
         初始化学生仓库
@@ -51,6 +64,7 @@ class StudentRepository:
         student_id = self.db.insert_and_get_id(
             sql, (student_number, name, class_id, gender, enrollment_year)
         )
+        _student_by_number_cache.pop(student_number)
         
         # 更新班级学生人数
         if class_id:
@@ -68,8 +82,7 @@ class StudentRepository:
         Returns:
             学生信息字典或None
         """
-        sql = "SELECT * FROM students WHERE student_id = %s"
-        return self.db.query_one(sql, (student_id,))
+        return self.db.query_one_prepared(self._GET_STUDENT_SQL, (student_id,))
     
     def get_student_by_number(self, student_number: str) -> Optional[Dict[str, Any]]:
         """
@@ -81,8 +94,14 @@ class StudentRepository:
         Returns:
             学生信息字典或None
         """
-        sql = "SELECT * FROM students WHERE student_number = %s"
-        return self.db.query_one(sql, (student_number,))
+        cached = _student_by_number_cache.get(student_number)
+        if cached is not None:
+            return dict(cached)
+        
+        result = self.db.query_one_prepared(self._GET_STUDENT_BY_NUMBER_SQL, (student_number,))
+        if result:
+            _student_by_number_cache.set(student_number, dict(result))
+        return result
     
     def list_students(
         self,
@@ -105,6 +124,52 @@ class StudentRepository:
         Returns:
             学生列表
         """
+        if not class_id and not gender and not enrollment_year:
+            # 无筛选条件时直接使用固定SQL
+            return self.db.query(self._LIST_STUDENTS_ALL_SQL, (limit, offset))
+        
+        where_clause, params = self._build_student_filters(class_id, gender, enrollment_year)
+        sql = f"""
+            SELECT * FROM students 
+            {where_clause}
+            ORDER BY student_number
+            LIMIT %s OFFSET %s
+        """
+        params.extend([limit, offset])
+        return self.db.query(sql, tuple(params))
+    
+    def iter_students(
+        self,
+        class_id: int = None,
+        gender: str = None,
+        enrollment_year: int = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式遍历学生（不分页），适合全量导出等大结果集场景
+        
+        Args:
+            class_id: 班级ID筛选
+            gender: 性别筛选
+            enrollment_year: 入学年份筛选
+            
+        Yields:
+            学生信息字典
+        """
+        where_clause, params = self._build_student_filters(class_id, gender, enrollment_year)
+        sql = f"""
+            SELECT * FROM students 
+            {where_clause}
+            ORDER BY student_number
+        """
+        return self.db.iter_query(sql, tuple(params))
+    
+    @staticmethod
+    def _build_student_filters(
+        class_id: int = None,
+        gender: str = None,
+        enrollment_year: int = None
+    ) -> Tuple[str, List[Any]]:
+        """构建学生查询的WHERE子句及参数"""
         conditions = []
         params = []
         
@@ -119,14 +184,7 @@ class StudentRepository:
             params.append(enrollment_year)
         
         where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
-        sql = f"""
-            SELECT * FROM students 
-            {where_clause}
-            ORDER BY student_number
-            LIMIT %s OFFSET %s
-        """
-        params.extend([limit, offset])
-        return self.db.query(sql, tuple(params))
+        return where_clause, params
     
     def update_student(self, student_id: int, **kwargs) -> None:
         """
@@ -136,17 +194,12 @@ class StudentRepository:
             student_id: 学生ID
             **kwargs: 要更新的字段
         """
-        # 获取原班级ID
-        old_student = self.get_student(student_id)
-        old_class_id = old_student['class_id'] if old_student else None
-        
-        allowed_fields = {'name', 'class_id', 'gender', 'enrollment_year'}
         updates = []
         params = []
         new_class_id = None
         
         for key, value in kwargs.items():
-            if key in allowed_fields:
+            if key in self._UPDATABLE_FIELDS:
                 updates.append(f"{key} = %s")
                 params.append(value)
                 if key == 'class_id':
@@ -155,16 +208,22 @@ class StudentRepository:
         if not updates:
             return
         
+        # 班级变更时需要同时更新原班级人数，先获取原班级ID
+        old_class_id = None
+        if new_class_id is not None:
+            old_student = self.get_student(student_id)
+            old_class_id = old_student['class_id'] if old_student else None
+        
         params.append(student_id)
         sql = f"UPDATE students SET {', '.join(updates)} WHERE student_id = %s"
         self.db.execute(sql, tuple(params))
+        _student_by_number_cache.clear()
         
         # 更新班级学生人数
         if new_class_id is not None and new_class_id != old_class_id:
-            if old_class_id:
-                self._update_class_student_count(old_class_id)
-            if new_class_id:
-                self._update_class_student_count(new_class_id)
+            self._update_class_student_counts(
+                [cid for cid in (old_class_id, new_class_id) if cid]
+            )
     
     def delete_student(self, student_id: int) -> None:
         """
@@ -179,6 +238,7 @@ class StudentRepository:
         
         sql = "DELETE FROM students WHERE student_id = %s"
         self.db.execute(sql, (student_id,))
+        _student_by_number_cache.clear()
         
         # 更新班级学生人数
         if class_id:
@@ -217,11 +277,11 @@ class StudentRepository:
             for s in students
         ]
         count = self.db.execute_many(sql, params_list)
+        _student_by_number_cache.clear()
         
         # 更新所有涉及班级的学生人数
         class_ids = set(s.get('class_id') for s in students if s.get('class_id'))
-        for class_id in class_ids:
-            self._update_class_student_count(class_id)
+        self._update_class_student_counts(class_ids)
         
         return count
     
@@ -239,8 +299,7 @@ class StudentRepository:
             sql = "SELECT COUNT(*) as count FROM students WHERE class_id = %s"
             result = self.db.query_one(sql, (class_id,))
         else:
-            sql = "SELECT COUNT(*) as count FROM students"
-            result = self.db.query_one(sql)
+            result = self.db.query_one(self._COUNT_STUDENTS_ALL_SQL)
         
         return result['count'] if result else 0
     
@@ -278,6 +337,31 @@ class StudentRepository:
         """
         self.db.execute(sql, (class_id, class_id))
     
+    def _update_class_student_counts(self, class_ids) -> None:
+        """
+        批量更新多个班级的学生人数（单条语句完成）
+        
+        Args:
+            class_ids: 班级ID集合
+        """
+        class_ids = tuple(class_ids)
+        if not class_ids:
+            return
+        
+        placeholders = ', '.join(['%s'] * len(class_ids))
+        sql = f"""
+            UPDATE classes c
+            LEFT JOIN (
+                SELECT class_id, COUNT(*) AS cnt
+                FROM students
+                WHERE class_id IN ({placeholders})
+                GROUP BY class_id
+            ) s ON c.class_id = s.class_id
+            SET c.student_count = COALESCE(s.cnt, 0)
+            WHERE c.class_id IN ({placeholders})
+        """
+        self.db.execute(sql, class_ids + class_ids)
+    
     def list_classes(self, limit: int = 100) -> List[Dict[str, Any]]:
         """
         获取班级列表
@@ -2,55 +2,196 @@
 用户仓库模块
 User repository for user management and authentication
 """
+import atexit
+import hashlib
 import logging
+import os
+import queue
+import re
+import threading
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple, Union
 import bcrypt
+from mysql.connector import errorcode, Error as MySQLError
+from backend.model.CacheModel import TTLCache
 from backend.model.ManagerModel import DatabaseManager
 from backend.model.InterfaceModel import IUserRepository
 
 logger = logging.getLogger(__name__)
 
+# 用户点查询缓存（进程内共享）
+# ('i', user_id) -> 用户行；('u', username) / ('e', email) -> user_id
+_user_cache = TTLCache(maxsize=4096, ttl=60.0)
+
+# 标准bcrypt哈希格式: $2a$/$2b$/$2y$ + 两位成本因子 + 53位盐与摘要
+_BCRYPT_HASH_RE = re.compile(r'^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$')
+
+# 按成本因子缓存的哑哈希，用于哈希缺失或格式异常时执行等时校验
+_dummy_hashes: Dict[int, bytes] = {}
+
+# 角色权限缓存（进程内共享）: role -> (权限名称元组, 权限名称集合)
+_permission_cache = TTLCache(maxsize=64, ttl=30.0)
+
+# users 全文索引是否可用（未执行 init_database 时不存在，首次失败后回退到LIKE）
+_fulltext_search_available = True
+
+
+class _LastLoginWriter:
+    """
+    最后登录时间的后台写入器
+    
+    登录成功后只把 user_id 放入有界队列，由守护线程按时间窗口合并同一用户的
+    多次登录，再以单条 UPDATE ... CURRENT_TIMESTAMP 批量落库；进程退出时
+    写入队列中剩余的记录。
+    """
+    
+    FLUSH_INTERVAL = 0.5
+    MAX_PENDING = 10000
+    BATCH_SIZE = 1000
+    CLOSE_TIMEOUT = 5.0
+    
+    def __init__(self, db: DatabaseManager):
+        """
+        初始化写入器并启动后台线程
+        
+        Args:
+            db: 数据库管理器实例（与用户仓库共用连接池）
+        """
+        self.db = db
+        # 队列中的 None 为停止信号
+        self._queue: 'queue.Queue[Optional[int]]' = queue.Queue(maxsize=self.MAX_PENDING)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, user_id: int) -> bool:
+        """
+        提交一次登录记录（不阻塞）
+        
+        Returns:
+            是否入队成功，队列已满或写入器已关闭时返回False
+        """
+        if self._closed.is_set():
+            return False
+        try:
+            self._queue.put_nowait(user_id)
+            return True
+        except queue.Full:
+            return False
+    
+    def close(self) -> None:
+        """停止后台线程，并等待其写入队列中剩余的记录"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            # 唤醒阻塞在空队列上的后台线程
+            self._queue.put(None, timeout=self.CLOSE_TIMEOUT)
+        except queue.Full:
+            pass
+        self._thread.join(self.CLOSE_TIMEOUT)
+    
+    def _run(self) -> None:
+        """后台循环：等待首条记录，攒满一个时间窗口后合并写入"""
+        while True:
+            user_id = self._queue.get()
+            stopping = user_id is None
+            pending = set() if stopping else {user_id}
+            if not stopping:
+                # 关闭时立即结束等待
+                stopping = self._closed.wait(self.FLUSH_INTERVAL)
+            while True:
+                try:
+                    user_id = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if user_id is None:
+                    stopping = True
+                else:
+                    # 同一用户在窗口内多次登录只更新一次
+                    pending.add(user_id)
+            if pending:
+                try:
+                    self._flush(pending)
+                except Exception as e:
+                    logger.error(f"Flush last login failed: {e}")
+            if stopping:
+                return
+    
+    def _flush(self, pending: Set[int]) -> None:
+        """批量更新最后登录时间并使对应缓存失效"""
+        user_ids = list(pending)
+        for start in range(0, len(user_ids), self.BATCH_SIZE):
+            batch = user_ids[start:start + self.BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            sql = (
+                "UPDATE users SET last_login = CURRENT_TIMESTAMP "
+                f"WHERE user_id IN ({placeholders})"
+            )
+            self.db.execute(sql, tuple(batch))
+            for user_id in batch:
+                _user_cache.pop(('i', user_id))
+
+
+_last_login_writer: Optional[_LastLoginWriter] = None
+_last_login_writer_lock = threading.Lock()
+
 
 class UserRepository(IUserRepository):
     """用户数据访问层"""
     
-    def __init__(self, db: DatabaseManager):
+    # bcrypt 成本因子（2^rounds 次迭代），可通过环境变量调整
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    # SHA-256预哈希格式的前缀，其后为标准bcrypt哈希；无前缀的为旧格式
+    PREHASH_PREFIX = '$sha256$'
+    
+    # 用户资料列（不含password_hash，可安全缓存与返回给前端）
+    _PROFILE_COLS = "user_id, username, email, role, created_at, last_login, is_active"
+    # 全文检索的最短关键词长度（与MySQL ngram_token_size默认值一致）
+    FULLTEXT_MIN_TERM_LEN = 2
+    
+    # 热点点查询SQL（使用服务端预处理语句复用）
+    _GET_USER_SQL = f"SELECT {_PROFILE_COLS} FROM users WHERE user_id = %s"
+    _GET_USER_BY_USERNAME_SQL = f"SELECT {_PROFILE_COLS} FROM users WHERE username = %s"
+    _GET_USER_BY_EMAIL_SQL = f"SELECT {_PROFILE_COLS} FROM users WHERE email = %s"
+    _GET_AUTH_BY_USERNAME_SQL = "SELECT user_id, password_hash, is_active FROM users WHERE username = %s"
+    _GET_PASSWORD_HASH_SQL = "SELECT password_hash FROM users WHERE user_id = %s"
+    
+    def __init__(self, db: DatabaseManager, bcrypt_rounds: int = None):
         """
         初始化用户仓库
         
         Args:
             db: 数据库管理器实例
+            bcrypt_rounds: bcrypt成本因子，默认使用 BCRYPT_ROUNDS
         """
         self.db = db
+        self.bcrypt_rounds = bcrypt_rounds or self.BCRYPT_ROUNDS
     
     # ==================== 基础CRUD操作 ====================
     
+    # get_by_id / get_by_username / delete 在对应实现之后直接绑定为别名，
+    # 此处仅保留需要转换参数形式的适配方法
+    
     def create(self, data: Dict[str, Any]) -> int:
         """创建用户记录"""
         return self.create_user(
             username=data['username'],
-            email=data['email'],
             password=data['password'],
-            role=data.get('role', 'student'),
-            full_name=data.get('full_name')
+            email=data.get('email'),
+            role=data.get('role', 'student')
         )
     
-    def get_by_id(self, id: int) -> Optional[Dict[str, Any]]:
-        """根据ID获取用户"""
-        return self.get_user_by_id(id)
-    
     def update(self, id: int, data: Dict[str, Any]) -> bool:
         """更新用户记录"""
-        return self.update_user(id, data)
-    
-    def delete(self, id: int) -> bool:
-        """删除用户记录"""
-        return self.delete_user(id)
+        self.update_user(id, **data)
+        return True
     
     def get_all(self, limit: int = None, offset: int = None) -> List[Dict[str, Any]]:
         """获取所有用户（分页）"""
-        return self.get_all_users(limit=limit, offset=offset)
+        return self.list_users(limit=limit or 100, offset=offset or 0)
     
     # ==================== 用户 CRUD ====================
     
@@ -84,7 +225,7 @@ class UserRepository(IUserRepository):
     
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """
-        获取用户信息
+        获取用户资料（不含密码哈希）
         
         Args:
             user_id: 用户ID
@@ -92,12 +233,16 @@ class UserRepository(IUserRepository):
         Returns:
             用户信息字典或None
         """
-        sql = "SELECT * FROM users WHERE user_id = %s"
-        return self.db.query_one(sql, (user_id,))
+        cached = _user_cache.get(('i', user_id))
+        if cached is not None:
+            return dict(cached)
+        
+        user = self.db.query_one_prepared(self._GET_USER_SQL, (user_id,))
+        if user:
+            self._cache_user(user)
+        return user
     
-    def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
-        """根据用户名获取用户"""
-        return self.get_user_by_username(username)
+    get_by_id = get_user
     
     def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
@@ -109,13 +254,22 @@ class UserRepository(IUserRepository):
         Returns:
             用户信息字典或None
         """
-        sql = "SELECT * FROM users WHERE email = %s"
-        return self.db.query_one(sql, (email,))
+        cached = self._get_cached_user('e', 'email', email)
+        if cached is not None:
+            return cached
+        
+        user = self.db.query_one_prepared(self._GET_USER_BY_EMAIL_SQL, (email,))
+        if user:
+            self._cache_user(user)
+        return user
     
     def search_users(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
         """
         搜索用户
         
+        关键词不短于ngram分词长度时走全文索引短语匹配，否则（或索引缺失时）
+        回退到 LIKE 子串匹配。
+        
         Args:
             query: 搜索关键词
             limit: 返回数量限制
@@ -123,15 +277,34 @@ class UserRepository(IUserRepository):
         Returns:
             用户列表
         """
-        sql = """
-            SELECT user_id, username, email, role, created_at, last_login, is_active 
+        global _fulltext_search_available
+        # 去掉引号，避免破坏布尔模式下的短语语法
+        term = query.replace('"', '').strip()
+        if _fulltext_search_available and len(term) >= self.FULLTEXT_MIN_TERM_LEN:
+            sql = f"""
+                SELECT {self._PROFILE_COLS}
+                FROM users 
+                WHERE MATCH(username, email) AGAINST(%s IN BOOLEAN MODE)
+                ORDER BY created_at DESC, user_id DESC
+                LIMIT %s
+            """
+            try:
+                return self.db.query_ro(sql, (f'"{term}"', limit))
+            except MySQLError as e:
+                if e.errno != errorcode.ER_FT_MATCHING_KEY_NOT_FOUND:
+                    raise
+                logger.warning("Full-text index on users not found, falling back to LIKE")
+                _fulltext_search_available = False
+        
+        sql = f"""
+            SELECT {self._PROFILE_COLS}
             FROM users 
             WHERE username LIKE %s OR email LIKE %s
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, user_id DESC
             LIMIT %s
         """
         search_pattern = f"%{query}%"
-        return self.db.query(sql, (search_pattern, search_pattern, limit))
+        return self.db.query_ro(sql, (search_pattern, search_pattern, limit))
     
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """
@@ -143,8 +316,16 @@ class UserRepository(IUserRepository):
         Returns:
             用户信息字典或None
         """
-        sql = "SELECT * FROM users WHERE username = %s"
-        return self.db.query_one(sql, (username,))
+        cached = self._get_cached_user('u', 'username', username)
+        if cached is not None:
+            return cached
+        
+        user = self.db.query_one_prepared(self._GET_USER_BY_USERNAME_SQL, (username,))
+        if user:
+            self._cache_user(user)
+        return user
+    
+    get_by_username = get_user_by_username
     
     def update_user(self, user_id: int, **kwargs) -> None:
         """
@@ -169,6 +350,7 @@ class UserRepository(IUserRepository):
         params.append(user_id)
         sql = f"UPDATE users SET {', '.join(updates)} WHERE user_id = %s"
         self.db.execute(sql, tuple(params))
+        self._invalidate_user(user_id)
     
     def update_password(self, user_id: int, password_hash: str) -> bool:
         """
@@ -183,11 +365,12 @@ class UserRepository(IUserRepository):
         """
         try:
             # 如果传入的不是哈希值，则进行加密
-            if not password_hash.startswith('$2b$'):
+            if not password_hash.startswith(('$2b$', self.PREHASH_PREFIX)):
                 password_hash = self._hash_password(password_hash)
             
             sql = "UPDATE users SET password_hash = %s WHERE user_id = %s"
             self.db.execute(sql, (password_hash, user_id))
+            self._invalidate_user(user_id)
             return True
         except Exception as e:
             logger.error(f"Update password failed: {e}")
@@ -211,11 +394,31 @@ class UserRepository(IUserRepository):
             else:
                 sql = "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE user_id = %s"
                 self.db.execute(sql, (user_id,))
+            self._invalidate_user(user_id)
             return True
         except Exception as e:
             logger.error(f"Update last login failed: {e}")
             return False
     
+    def queue_last_login(self, user_id: int) -> None:
+        """
+        异步更新最后登录时间
+        
+        队列已满或进程正在退出时退化为同步更新，保证登录时间不丢失。
+        
+        Args:
+            user_id: 用户ID
+        """
+        global _last_login_writer
+        if _last_login_writer is None:
+            with _last_login_writer_lock:
+                if _last_login_writer is None:
+                    _last_login_writer = _LastLoginWriter(self.db)
+        
+        if not _last_login_writer.submit(user_id):
+            logger.warning("Last login queue is unavailable, updating synchronously")
+            self.update_last_login(user_id)
+    
     def delete_user(self, user_id: int) -> bool:
         """
         删除用户
@@ -229,17 +432,21 @@ class UserRepository(IUserRepository):
         try:
             sql = "DELETE FROM users WHERE user_id = %s"
             self.db.execute(sql, (user_id,))
+            self._invalidate_user(user_id)
             return True
         except Exception as e:
             logger.error(f"Delete user failed: {e}")
             return False
     
+    delete = delete_user
+    
     def list_users(
         self,
         role: str = None,
         is_active: bool = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        after: Optional[Tuple[datetime, int]] = None
     ) -> List[Dict[str, Any]]:
         """
         查询用户列表
@@ -248,7 +455,8 @@ class UserRepository(IUserRepository):
             role: 角色筛选
             is_active: 是否激活筛选
             limit: 返回数量限制
-            offset: 偏移量
+            offset: 偏移量（传入after时忽略）
+            after: 键集分页游标 (created_at, user_id)，返回该位置之后的记录
             
         Returns:
             用户列表
@@ -262,17 +470,88 @@ class UserRepository(IUserRepository):
         if is_active is not None:
             conditions.append("is_active = %s")
             params.append(is_active)
+        if after is not None:
+            # 键集分页：沿 (created_at, user_id) 索引定位，无需扫描并丢弃前offset行
+            conditions.append("(created_at, user_id) < (%s, %s)")
+            params.extend(after)
         
         where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         sql = f"""
             SELECT user_id, username, email, role, created_at, last_login, is_active 
             FROM users 
             {where_clause}
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
+            ORDER BY created_at DESC, user_id DESC
+            LIMIT %s
         """
-        params.extend([limit, offset])
-        return self.db.query(sql, tuple(params))
+        params.append(limit)
+        if after is None and offset:
+            sql += " OFFSET %s"
+            params.append(offset)
+        return self.db.query_ro(sql, tuple(params))
+    
+    def list_users_page(
+        self,
+        role: str = None,
+        is_active: bool = None,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[datetime, int]]]:
+        """
+        按键集分页查询用户列表
+        
+        Args:
+            role: 角色筛选
+            is_active: 是否激活筛选
+            limit: 每页数量
+            after: 上一页返回的游标，None表示第一页
+            
+        Returns:
+            (用户列表, 下一页游标)，已到末页时游标为None
+        """
+        users = self.list_users(role=role, is_active=is_active, limit=limit, after=after)
+        next_cursor = None
+        if len(users) == limit and users:
+            last = users[-1]
+            next_cursor = (last['created_at'], last['user_id'])
+        return users, next_cursor
+    
+    # ==================== 用户缓存 ====================
+    
+    @classmethod
+    def cache_clear(cls) -> None:
+        """清空用户及角色权限缓存"""
+        _user_cache.clear()
+        _permission_cache.clear()
+    
+    @staticmethod
+    def _cache_user(user: Dict[str, Any]) -> None:
+        """缓存用户行，并登记用户名、邮箱到user_id的索引"""
+        user_id = user['user_id']
+        _user_cache.set(('i', user_id), dict(user))
+        _user_cache.set(('u', user['username']), user_id)
+        if user.get('email'):
+            _user_cache.set(('e', user['email']), user_id)
+    
+    @staticmethod
+    def _get_cached_user(kind: str, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        """
+        通过用户名/邮箱索引读取缓存的用户
+        
+        索引只在用户行失效时随之失效，因此需校验缓存行的字段仍与查询值一致
+        （例如邮箱已被修改时，旧邮箱索引不再命中）。
+        """
+        user_id = _user_cache.get((kind, value))
+        if user_id is None:
+            return None
+        user = _user_cache.get(('i', user_id))
+        if user is None or user.get(field) != value:
+            return None
+        return dict(user)
+    
+    @staticmethod
+    def _invalidate_user(user_id: int) -> None:
+        """使用户缓存失效"""
+        _user_cache.pop(('i', user_id))
     
     # ==================== 密码验证 ====================
     
@@ -287,55 +566,120 @@ class UserRepository(IUserRepository):
         Returns:
             验证成功返回用户信息，失败返回None
         """
-        user = self.get_user_by_username(username)
-        if not user:
+        auth = self.get_user_for_auth(username)
+        
+        # 无论用户是否存在、是否激活都执行一次bcrypt校验，避免通过响应耗时枚举用户名
+        if auth:
+            target_hash = auth['password_hash']
+        else:
+            target_hash = self.PREHASH_PREFIX + self._dummy_hash().decode('ascii')
+        password_ok = self._check_password(password, target_hash)
+        
+        if not auth or not password_ok:
             return None
         
-        if not user.get('is_active', True):
+        if not auth.get('is_active', True):
             logger.warning(f"User {username} is not active")
             return None
         
-        if self._check_password(password, user['password_hash']):
-            # 更新最后登录时间
-            self.update_last_login(user['user_id'])
-            return user
+        user = self.get_user(auth['user_id'])
+        # 最后登录时间交由后台线程写入，不阻塞登录响应
+        self.queue_last_login(auth['user_id'])
+        return user
+    
+    def get_user_for_auth(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        获取认证所需的最小用户行（不缓存）
         
-        return None
+        Args:
+            username: 用户名
+            
+        Returns:
+            包含 user_id、password_hash、is_active 的字典或None
+        """
+        return self.db.query_one_prepared(self._GET_AUTH_BY_USERNAME_SQL, (username,))
+    
+    def get_password_hash(self, user_id: int) -> Optional[str]:
+        """
+        获取用户的密码哈希（不缓存）
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            密码哈希或None
+        """
+        row = self.db.query_one_prepared(self._GET_PASSWORD_HASH_SQL, (user_id,))
+        return row['password_hash'] if row else None
     
     def _hash_password(self, password: str) -> str:
         """
         加密密码
         
+        先做SHA-256预哈希得到定长64字节输入，避免bcrypt在72字节处截断
+        导致长密码前缀相同即可通过验证。
+        
         Args:
             password: 明文密码
             
         Returns:
             加密后的密码哈希
         """
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
+        hashed = bcrypt.hashpw(
+            self._prehash(password), bcrypt.gensalt(rounds=self.bcrypt_rounds)
+        )
+        return self.PREHASH_PREFIX + hashed.decode('utf-8')
+    
+    @staticmethod
+    def _prehash(password: Union[str, bytes]) -> bytes:
+        """计算密码的SHA-256十六进制摘要（bcrypt输入），已编码的字节串直接使用"""
+        if isinstance(password, str):
+            password = password.encode('utf-8')
+        return hashlib.sha256(password).hexdigest().encode('ascii')
     
-    def _check_password(self, password: str, password_hash: str) -> bool:
+    def _check_password(self, password: Union[str, bytes], password_hash: Union[str, bytes]) -> bool:
         """
         检查密码是否匹配
         
         Args:
-            password: 明文密码
+            password: 明文密码，可传入已按UTF-8编码的字节串以免重复编码
             password_hash: 存储的密码哈希
             
         Returns:
             是否匹配
         """
+        password_hash = password_hash or ''
+        if isinstance(password_hash, bytes):
+            password_hash = password_hash.decode('ascii', 'replace')
+        if password_hash.startswith(self.PREHASH_PREFIX):
+            candidate = self._prehash(password)
+            stored = password_hash[len(self.PREHASH_PREFIX):]
+        else:
+            # 旧格式：直接对明文做bcrypt
+            candidate = password.encode('utf-8') if isinstance(password, str) else password
+            stored = password_hash
+        
+        if not _BCRYPT_HASH_RE.match(stored):
+            # 格式异常时仍执行一次bcrypt，使耗时与正常校验路径一致；
+            # 使用定长的预哈希作为输入，避免超长明文触发bcrypt的长度异常
+            bcrypt.checkpw(self._prehash(password), self._dummy_hash())
+            logger.error("Password check failed: malformed password hash")
+            return False
+        
         try:
-            return bcrypt.checkpw(
-                password.encode('utf-8'),
-                password_hash.encode('utf-8')
-            )
-        except Exception as e:
+            return bcrypt.checkpw(candidate, stored.encode('ascii'))
+        except ValueError as e:
             logger.error(f"Password check failed: {e}")
             return False
     
+    def _dummy_hash(self) -> bytes:
+        """获取与当前成本因子一致的哑哈希（首次使用时生成）"""
+        dummy = _dummy_hashes.get(self.bcrypt_rounds)
+        if dummy is None:
+            dummy = bcrypt.hashpw(b'dummy-password', bcrypt.gensalt(rounds=self.bcrypt_rounds))
+            _dummy_hashes[self.bcrypt_rounds] = dummy
+        return dummy
+    
     # ==================== 权限管理 ====================
     
     def get_permissions(self, role: str) -> List[str]:
@@ -348,12 +692,22 @@ class UserRepository(IUserRepository):
         Returns:
             权限名称列表
         """
+        return list(self._get_role_permissions(role)[0])
+    
+    def _get_role_permissions(self, role: str) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+        """获取角色的已允许权限（带缓存），返回 (权限名称元组, 权限名称集合)"""
+        cached = _permission_cache.get(role)
+        if cached is not None:
+            return cached
+        
         sql = """
             SELECT permission_name FROM role_permissions 
             WHERE role = %s AND is_allowed = TRUE
         """
-        results = self.db.query(sql, (role,))
-        return [r['permission_name'] for r in results]
+        names = tuple(name for (name,) in self.db.query_rows(sql, (role,)))
+        cached = (names, frozenset(names))
+        _permission_cache.set(role, cached)
+        return cached
     
     def set_permission(self, role: str, permission: str, is_allowed: bool) -> None:
         """
@@ -364,12 +718,28 @@ class UserRepository(IUserRepository):
             permission: 权限名称
             is_allowed: 是否允许
         """
-        sql = """
+        self.set_permissions_bulk([(role, permission, is_allowed)])
+    
+    def set_permissions_bulk(self, items: List[Tuple[str, str, bool]]) -> None:
+        """
+        批量设置角色权限（单条多行 INSERT ... ON DUPLICATE KEY UPDATE）
+        
+        Args:
+            items: (角色名称, 权限名称, 是否允许) 列表
+        """
+        if not items:
+            return
+        
+        placeholders = ', '.join(['(%s, %s, %s)'] * len(items))
+        sql = f"""
             INSERT INTO role_permissions (role, permission_name, is_allowed)
-            VALUES (%s, %s, %s)
+            VALUES {placeholders}
             ON DUPLICATE KEY UPDATE is_allowed = VALUES(is_allowed)
         """
-        self.db.execute(sql, (role, permission, is_allowed))
+        params = tuple(value for item in items for value in item)
+        self.db.execute(sql, params)
+        for role in {item[0] for item in items}:
+            _permission_cache.pop(role)
     
     def has_permission(self, user_id: int, permission: str) -> bool:
         """
@@ -382,13 +752,10 @@ class UserRepository(IUserRepository):
         Returns:
             是否有权限
         """
-        sql = """
-            SELECT rp.is_allowed FROM role_permissions rp
-            JOIN users u ON u.role = rp.role
-            WHERE u.user_id = %s AND rp.permission_name = %s
-        """
-        result = self.db.query_one(sql, (user_id, permission))
-        return result['is_allowed'] if result else False
+        user = self.get_user(user_id)
+        if not user:
+            return False
+        return permission in self._get_role_permissions(user['role'])[1]
     
     def get_all_permissions_for_user(self, user_id: int) -> List[str]:
         """
@@ -400,10 +767,7 @@ class UserRepository(IUserRepository):
         Returns:
             权限名称列表
         """
-        sql = """
-            SELECT rp.permission_name FROM role_permissions rp
-            JOIN users u ON u.role = rp.role
-            WHERE u.user_id = %s AND rp.is_allowed = TRUE
-        """
-        results = self.db.query(sql, (user_id,))
-        return [r['permission_name'] for r in results]
+        user = self.get_user(user_id)
+        if not user:
+            return []
+        return self.get_permissions(user['role'])
@@ -81,7 +81,7 @@ def handle_detect_command(args):
     print(f"置信度阈值: {args.conf}")
     
     try:
-        # 配置服务容器
+        # 配置服务容器（只登记服务类型，不创建实例）
         configure_default_services()
         
         # 获取检测服务
@@ -12,7 +12,9 @@ Usage:
 import argparse
 import logging
 import sys
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Optional
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent.parent
@@ -33,6 +35,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class TrainConfig:
+    """Training parameters passed to ``TrainingPipeline.configure``."""
+    epochs: int
+    batch_size: int
+    img_size: int
+    lr0: float
+    patience: int
+    project: str
+    name: str
+    exist_ok: bool
+    device: Optional[str]
+    workers: int
+    seed: int
+    verbose: bool
+    cache: bool
+    amp: bool
+    
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> 'TrainConfig':
+        """Build the config once from parsed arguments."""
+        values = vars(args)
+        fields = {key: values[key] for key in cls.__dataclass_fields__ if key in values}
+        fields['amp'] = args.amp and not args.no_amp
+        return cls(**fields)
+
+
+@dataclass(frozen=True)
+class AugmentationConfig:
+    """Augmentation parameters passed to ``TrainingPipeline.configure_augmentation``."""
+    mosaic: float
+    mixup: float
+    hsv_h: float
+    hsv_s: float
+    hsv_v: float
+    degrees: float
+    translate: float
+    scale: float
+    fliplr: float
+    flipud: float
+    
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> 'AugmentationConfig':
+        """Build the config once from parsed arguments."""
+        values = vars(args)
+        return cls(**{key: values[key] for key in cls.__dataclass_fields__})
+
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -287,6 +337,8 @@ def main():
     
     # Determine pretrained setting
     pretrained = args.pretrained and not args.no_pretrained
+    train_config = TrainConfig.from_args(args)
+    augmentation_config = AugmentationConfig.from_args(args)
     
     # Initialize training pipeline
     logger.info("=" * 60)
@@ -311,37 +363,11 @@ def main():
         
         # Configure training parameters
         logger.info("Configuring training parameters...")
-        pipeline.configure(
-            epochs=args.epochs,
-            batch_size=args.batch_size,
-            img_size=args.img_size,
-            lr0=args.lr0,
-            patience=args.patience,
-            project=args.project,
-            name=args.name,
-            exist_ok=args.exist_ok,
-            device=args.device,
-            workers=args.workers,
-            seed=args.seed,
-            verbose=args.verbose,
-            cache=args.cache,
-            amp=args.amp and not args.no_amp,
-        )
+        pipeline.configure(**asdict(train_config))
         
         # Configure data augmentation
         logger.info("Configuring data augmentation...")
-        pipeline.configure_augmentation(
-            mosaic=args.mosaic,
-            mixup=args.mixup,
-            hsv_h=args.hsv_h,
-            hsv_s=args.hsv_s,
-            hsv_v=args.hsv_v,
-            degrees=args.degrees,
-            translate=args.translate,
-            scale=args.scale,
-            fliplr=args.fliplr,
-            flipud=args.flipud,
-        )
+        pipeline.configure_augmentation(**asdict(augmentation_config))
         
         # Print configuration summary
         logger.info("-" * 60)
@@ -21,11 +21,25 @@ import logging
 import sys
 import os
 from pathlib import Path
+from types import MappingProxyType
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+# CUDA缓存分配器配置：可扩展段让同一虚拟地址区间按需增长，减少碎片导致的OOM
+# 必须在CUDA初始化之前设置；用户已显式设置时不覆盖
+CUDA_ALLOC_CONF = 'expandable_segments:True,max_split_size_mb:128,garbage_collection_threshold:0.8'
+
+# 显存告警阈值(GB)，为6GB显卡保留余量
+VRAM_WARN_GB = 5.5
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -76,6 +90,61 @@ PRESETS = {
 }
 
 
+# 与预设无关的固定训练参数（针对6GB显存调优）
+STATIC_TRAIN_CONFIG = {
+    # 学习率配置
+    'momentum': 0.937,
+    'weight_decay': 0.0005,
+    'warmup_epochs': 3.0,
+    'warmup_momentum': 0.8,
+    
+    # 显存优化配置
+    'amp': True,  # 混合精度训练 - 关键优化
+    'device': 0,  # 使用GPU 0
+    
+    # 数据增强 - 适度增强
+    'hsv_h': 0.015,
+    'hsv_s': 0.7,
+    'hsv_v': 0.4,
+    'degrees': 10.0,  # 轻微旋转
+    'translate': 0.1,
+    'scale': 0.5,
+    'shear': 2.0,
+    'flipud': 0.0,
+    'fliplr': 0.5,
+    'erasing': 0.3,
+    
+    # 输出配置
+    'save': True,
+    'save_period': 10,  # 每10轮保存一次
+    
+    # 其他配置
+    'deterministic': False,  # 固定imgsz下允许cuDNN自动调优卷积算法；需要可复现时用 --deterministic
+    'plots': True,
+    
+    # 损失函数权重
+    'box': 7.5,
+    'cls': 0.5,
+    'dfl': 1.5,
+}
+
+# Ultralytics 默认名义批次大小，梯度累积步数 = round(nbs / batch)
+DEFAULT_NBS = 64
+
+# 导入时展开的只读预设训练配置，调用时只需叠加命令行参数
+_FROZEN_PRESETS = {
+    name: MappingProxyType({
+        'model': preset['model'],
+        'batch': preset['batch_size'],
+        'imgsz': preset['img_size'],
+        'workers': preset['workers'],
+        'cache': preset['cache'],
+        **STATIC_TRAIN_CONFIG,
+    })
+    for name, preset in PRESETS.items()
+}
+
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -112,6 +181,13 @@ def parse_args():
                         help='批次大小 (覆盖预设)')
     parser.add_argument('--img-size', '-i', type=int, default=None,
                         help='图像尺寸 (覆盖预设)')
+    parser.add_argument('--auto-batch', type=float, nargs='?', const=0.6, default=None,
+                        metavar='FRACTION',
+                        help='训练前在GPU上探测可容纳的最大批次大小，目标占用可用显存的比例 '
+                             '(仅写 --auto-batch 等同 0.6，专用训练机可用 0.85)')
+    parser.add_argument('--accumulate', type=int, default=None,
+                        help='梯度累积步数，有效批次 = batch × accumulate '
+                             '(默认按 nbs=64 自动累积)')
     parser.add_argument('--epochs', '-e', type=int, default=100,
                         help='训练轮数 (default: 100)')
     parser.add_argument('--patience', type=int, default=30,
@@ -146,19 +222,35 @@ def parse_args():
                         help='最后N轮关闭Mosaic (default: 15)')
     
     # 高级选项
-    parser.add_argument('--cache', action='store_true',
-                        help='缓存图像到内存 (需要足够RAM)')
+    parser.add_argument('--cache', type=str, nargs='?', const='auto', default='none',
+                        choices=['auto', 'ram', 'disk', 'none'],
+                        help='图像缓存: ram=内存, disk=解码后存盘, auto=按可用内存选择 '
+                             '(仅写 --cache 等同 auto, default: none)')
     parser.add_argument('--workers', type=int, default=None,
                         help='数据加载线程数 (覆盖预设)')
+    parser.add_argument('--no-pin-memory', action='store_true',
+                        help='关闭DataLoader锁页内存 (内存紧张时使用，默认开启)')
     parser.add_argument('--seed', type=int, default=42,
                         help='随机种子 (default: 42)')
+    parser.add_argument('--precision', type=str, default='auto',
+                        choices=['auto', 'fp16', 'bf16'],
+                        help='AMP混合精度类型 (auto: 支持BF16的显卡使用bf16，否则fp16)')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='对骨干/颈部模块启用梯度检查点，以约30%%训练耗时换取更低的激活显存')
+    parser.add_argument('--channels-last', action='store_true',
+                        help='模型与输入使用NHWC内存布局，发挥Tensor Core卷积吞吐 (需要SM 7.0+显卡)')
+    parser.add_argument('--compile', action='store_true',
+                        help='使用torch.compile融合算子并启用CUDA Graphs (需要SM 8.0+显卡)')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='使用确定性算法保证可复现（关闭cuDNN自动调优，训练更慢）')
     
     # 验证和导出
     parser.add_argument('--val', action='store_true', default=True,
                         help='训练后运行验证')
     parser.add_argument('--export', type=str, default=None,
-                        choices=['onnx', 'torchscript', 'tensorrt'],
-                        help='训练后导出模型格式')
+                        choices=['onnx', 'torchscript', 'tensorrt', 'int8', 'int8-trt'],
+                        help='训练后导出模型格式 (int8: OpenVINO INT8量化, int8-trt: TensorRT INT8引擎，'
+                             '均以数据集验证集校准)')
     
     # 调试选项
     parser.add_argument('--verbose', action='store_true', default=True,
@@ -166,115 +258,278 @@ def parse_args():
     parser.add_argument('--dry-run', action='store_true',
                         help='只显示配置，不实际训练')
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.accumulate is not None and args.accumulate < 1:
+        parser.error(f"--accumulate 必须 >= 1: {args.accumulate}")
+    if args.auto_batch is not None:
+        if not 0 < args.auto_batch < 1:
+            parser.error(f"--auto-batch 的显存比例必须在 (0, 1) 之间: {args.auto_batch}")
+        if args.batch_size is not None or args.accumulate is not None:
+            parser.error("--auto-batch 不能与 --batch-size 或 --accumulate 同时使用")
+    return args
+
+
+IMAGE_SUFFIXES = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'})
+
+# 图像缓存最多占用可用内存（或磁盘剩余空间）的比例
+CACHE_MAX_FRACTION = 0.5
+
+
+def count_train_images(data_yaml) -> int:
+    """
+    统计数据集训练集图像数量
+    
+    Args:
+        data_yaml: 数据集配置文件路径
+        
+    Returns:
+        图像数量，无法解析时返回0
+    """
+    import yaml
+    
+    data_yaml = Path(data_yaml)
+    with open(data_yaml, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    
+    root = Path(data.get('path') or data_yaml.parent)
+    if not root.is_absolute():
+        root = data_yaml.parent / root
+    
+    sources = data.get('train') or []
+    if isinstance(sources, str):
+        sources = [sources]
+    
+    count = 0
+    for source in sources:
+        source = Path(source)
+        if not source.is_absolute():
+            source = root / source
+        if source.is_dir():
+            count += sum(1 for p in source.rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+        elif source.is_file():
+            # 图像路径列表文件
+            with open(source, 'r', encoding='utf-8') as f:
+                count += sum(1 for line in f if line.strip())
+    return count
+
+
+def select_cache_mode(data_yaml, imgsz):
+    """
+    根据数据集解码后的体积自动选择图像缓存方式
+    
+    解码后体积按 图像数 × imgsz² × 3 字节估算（Ultralytics缓存的是缩放到
+    imgsz后的图像）；不超过可用内存的一半时缓存到内存，否则在磁盘空间充足
+    时缓存到磁盘，都不满足时不缓存。
+    
+    Args:
+        data_yaml: 数据集配置文件路径
+        imgsz: 训练图像尺寸
+        
+    Returns:
+        'ram'、'disk' 或 None
+    """
+    import shutil
+    
+    try:
+        num_images = count_train_images(data_yaml)
+    except Exception as e:
+        logger.warning(f"无法统计训练集图像数量，不启用缓存: {e}")
+        return None
+    
+    footprint = num_images * imgsz * imgsz * 3
+    logger.info(f"训练集图像: {num_images} 张，解码后约 {footprint / 1024 ** 3:.1f} GB")
+    
+    if PSUTIL_AVAILABLE:
+        available = psutil.virtual_memory().available
+        if footprint < available * CACHE_MAX_FRACTION:
+            return 'ram'
+    else:
+        logger.warning("未安装psutil，无法检测可用内存，跳过RAM缓存")
+    
+    if footprint < shutil.disk_usage(Path(data_yaml).resolve().parent).free * CACHE_MAX_FRACTION:
+        return 'disk'
+    return None
 
 
 def get_optimized_config(args):
     """获取针对4050优化的训练配置"""
-    # 从预设开始
-    preset = PRESETS[args.preset]
+    # 预设可被覆盖的参数，仅在命令行显式指定时覆盖
+    overrides = {
+        key: value for key, value in (
+            ('model', args.model),
+            ('batch', args.batch_size),
+            ('imgsz', args.img_size),
+            ('workers', args.workers),
+        )
+        if value is not None
+    }
+    if args.cache != 'none':
+        cache = select_cache_mode(args.data, overrides.get('imgsz', _FROZEN_PRESETS[args.preset]['imgsz'])) \
+            if args.cache == 'auto' else args.cache
+        overrides['cache'] = cache or False
+    if args.auto_batch is not None:
+        # 0 < batch < 1 时 Ultralytics 在训练开始前按该显存比例二分探测批次大小
+        overrides['batch'] = args.auto_batch
+    if args.accumulate is not None:
+        # Ultralytics 按 accumulate = max(round(nbs / batch), 1) 累积梯度
+        batch = overrides.get('batch', _FROZEN_PRESETS[args.preset]['batch'])
+        overrides['nbs'] = batch * args.accumulate
     
     config = {
-        # 模型配置
-        'model': args.model or preset['model'],
-        
-        # 训练配置 - 针对6GB显存优化
+        **_FROZEN_PRESETS[args.preset],
+        **overrides,
         'epochs': args.epochs,
-        'batch': args.batch_size or preset['batch_size'],
-        'imgsz': args.img_size or preset['img_size'],
         'patience': args.patience,
-        
-        # 学习率配置
         'lr0': args.lr0,
         'lrf': args.lrf,
-        'momentum': 0.937,
-        'weight_decay': 0.0005,
-        'warmup_epochs': 3.0,
-        'warmup_momentum': 0.8,
-        
-        # 显存优化配置
-        'amp': True,  # 混合精度训练 - 关键优化
-        'cache': args.cache or preset['cache'],
-        'workers': args.workers or preset['workers'],
-        'device': 0,  # 使用GPU 0
-        
-        # 数据增强 - 适度增强
         'mosaic': args.mosaic,
         'mixup': args.mixup,
         'close_mosaic': args.close_mosaic,
-        'hsv_h': 0.015,
-        'hsv_s': 0.7,
-        'hsv_v': 0.4,
-        'degrees': 10.0,  # 轻微旋转
-        'translate': 0.1,
-        'scale': 0.5,
-        'shear': 2.0,
-        'flipud': 0.0,
-        'fliplr': 0.5,
-        'erasing': 0.3,
-        
-        # 输出配置
         'project': args.project,
         'name': args.name,
         'exist_ok': args.exist_ok,
-        'save': True,
-        'save_period': 10,  # 每10轮保存一次
-        
-        # 其他配置
         'seed': args.seed,
-        'deterministic': True,
+        'deterministic': args.deterministic,
         'verbose': args.verbose,
-        'plots': True,
-        
-        # 损失函数权重
-        'box': 7.5,
-        'cls': 0.5,
-        'dfl': 1.5,
     }
     
-    return config, preset['description']
+    return config, PRESETS[args.preset]['description']
 
 
-def print_config_summary(config, preset_desc, data_path):
-    """打印配置摘要"""
-    logger.info("=" * 70)
-    logger.info("RTX 4050 (6GB) 优化训练配置")
-    logger.info("=" * 70)
-    logger.info(f"预设: {preset_desc}")
-    logger.info("-" * 70)
-    logger.info("核心配置:")
-    logger.info(f"  模型: {config['model']}")
-    logger.info(f"  数据集: {data_path}")
-    logger.info(f"  训练轮数: {config['epochs']}")
-    logger.info(f"  批次大小: {config['batch']}")
-    logger.info(f"  图像尺寸: {config['imgsz']}")
-    logger.info(f"  初始学习率: {config['lr0']}")
-    logger.info(f"  早停耐心值: {config['patience']}")
-    logger.info("-" * 70)
-    logger.info("显存优化:")
-    logger.info(f"  混合精度(AMP): {config['amp']}")
-    logger.info(f"  数据加载线程: {config['workers']}")
-    logger.info(f"  图像缓存: {config['cache']}")
-    logger.info("-" * 70)
-    logger.info("数据增强:")
-    logger.info(f"  Mosaic: {config['mosaic']}")
-    logger.info(f"  MixUp: {config['mixup']}")
-    logger.info(f"  关闭Mosaic轮数: {config['close_mosaic']}")
-    logger.info("-" * 70)
-    logger.info("输出:")
-    logger.info(f"  保存目录: {config['project']}/{config['name']}")
-    logger.info("=" * 70)
+def resolve_precision(requested: str) -> str:
+    """
+    确定AMP混合精度类型
+    
+    Args:
+        requested: 命令行指定的精度 (auto/fp16/bf16)
+        
+    Returns:
+        实际使用的精度 (fp16/bf16)
+    """
+    if requested == 'fp16':
+        return 'fp16'
+    
+    try:
+        import torch
+        bf16_supported = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    except ImportError:
+        bf16_supported = False
+    
+    if requested == 'bf16' and not bf16_supported:
+        logger.warning("当前显卡不支持BF16，回退到FP16混合精度")
+    return 'bf16' if bf16_supported else 'fp16'
 
 
-def estimate_vram_usage(config):
-    """估算显存使用量"""
-    model_vram = {
-        'yolo11n': 1.5,  # GB
-        'yolo11s': 2.5,
-        'yolo11m': 4.0,
-    }
+def enable_bf16_autocast(model) -> bool:
+    """
+    将 Ultralytics 训练的混合精度切换为 BF16
+    
+    BF16 与 FP32 指数位宽相同，不会上溢/下溢，因此替换训练循环使用的
+    autocast 为 bfloat16，并在训练器准备完成后关闭 GradScaler。
+    
+    Args:
+        model: ultralytics.YOLO 实例
+        
+    Returns:
+        是否已启用
+    """
+    import torch
+    from ultralytics.engine import trainer as trainer_module
     
-    base_vram = model_vram.get(config['model'], 2.0)
+    if not hasattr(trainer_module, 'autocast'):
+        logger.warning("当前Ultralytics版本不支持替换autocast，继续使用FP16混合精度")
+        return False
+    
+    def bf16_autocast(enabled: bool, device: str = 'cuda'):
+        return torch.autocast(device_type='cuda', dtype=torch.bfloat16, enabled=enabled)
+    
+    def _disable_grad_scaler(trainer):
+        if hasattr(torch.amp, 'GradScaler'):
+            trainer.scaler = torch.amp.GradScaler('cuda', enabled=False)
+        else:
+            trainer.scaler = torch.cuda.amp.GradScaler(enabled=False)
+    
+    trainer_module.autocast = bf16_autocast
+    model.add_callback('on_pretrain_routine_end', _disable_grad_scaler)
+    return True
+
+
+def is_auto_batch(config) -> bool:
+    """批次大小是否交由Ultralytics AutoBatch在训练前探测"""
+    return config['batch'] < 1
+
+
+def effective_batch_size(config) -> int:
+    """计算梯度累积后的有效批次大小（未设置nbs时使用Ultralytics默认值64）"""
+    batch = config['batch']
+    accumulate = max(round(config.get('nbs', DEFAULT_NBS) / batch), 1)
+    return batch * accumulate
+
+
+def pin_memory_enabled() -> bool:
+    """Ultralytics DataLoader 是否使用锁页内存（与其读取 PIN_MEMORY 环境变量的方式一致）"""
+    return os.getenv('PIN_MEMORY', 'True').lower() == 'true'
+
+
+def print_config_summary(config, preset_desc, data_path, precision='fp16'):
+    """打印配置摘要（整体拼接后一次输出）"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    
+    if is_auto_batch(config):
+        batch_lines = [
+            f"  批次大小: 自动 (目标显存占用 {config['batch']:.0%})",
+            f"  有效批次大小: 自动 × 累积 ≈ {config.get('nbs', DEFAULT_NBS)}",
+        ]
+    else:
+        effective_batch = effective_batch_size(config)
+        batch_lines = [
+            f"  批次大小: {config['batch']}",
+            f"  有效批次大小: {config['batch']} × {effective_batch // config['batch']} = {effective_batch}",
+        ]
+    lines = [
+        "=" * 70,
+        "RTX 4050 (6GB) 优化训练配置",
+        "=" * 70,
+        f"预设: {preset_desc}",
+        "-" * 70,
+        "核心配置:",
+        f"  模型: {config['model']}",
+        f"  数据集: {data_path}",
+        f"  训练轮数: {config['epochs']}",
+        *batch_lines,
+        f"  图像尺寸: {config['imgsz']}",
+        f"  初始学习率: {config['lr0']}",
+        f"  早停耐心值: {config['patience']}",
+        "-" * 70,
+        "显存优化:",
+        f"  混合精度(AMP): {config['amp']} ({precision})",
+        f"  数据加载线程: {config['workers']} (锁页内存: {pin_memory_enabled()})",
+        f"  图像缓存: {config['cache']}",
+        "-" * 70,
+        "数据增强:",
+        f"  Mosaic: {config['mosaic']}",
+        f"  MixUp: {config['mixup']}",
+        f"  关闭Mosaic轮数: {config['close_mosaic']}",
+        "-" * 70,
+        "输出:",
+        f"  保存目录: {config['project']}/{config['name']}",
+        "=" * 70,
+    ]
+    logger.info("\n" + "\n".join(lines))
+
+
+# 各模型在 batch=8、imgsz=640、FP32 下的基准显存(GB)
+MODEL_BASE_VRAM_GB = MappingProxyType({
+    'yolo11n': 1.5,
+    'yolo11s': 2.5,
+    'yolo11m': 4.0,
+})
+
+
+def estimate_vram_usage(config, gradient_checkpointing=False):
+    """估算显存使用量"""
+    base_vram = MODEL_BASE_VRAM_GB.get(config['model'], 2.0)
     
     # 批次大小影响
     batch_factor = config['batch'] / 8
@@ -285,35 +540,314 @@ def estimate_vram_usage(config):
     # AMP减少约30%显存
     amp_factor = 0.7 if config['amp'] else 1.0
     
-    estimated = base_vram * batch_factor * img_factor * amp_factor
+    # 梯度检查点不保存中间激活，约减少40%显存
+    checkpoint_factor = 0.6 if gradient_checkpointing else 1.0
+    
+    estimated = base_vram * batch_factor * img_factor * amp_factor * checkpoint_factor
     
     return estimated
 
 
+# 启用梯度检查点的模块类型（计算量与激活占用较大的骨干/颈部模块）
+CHECKPOINT_BLOCK_TYPES = frozenset({'C3k2', 'C2PSA', 'C2f', 'C3', 'C3k', 'SPPF'})
+
+
+def checkpoint_blocks(detection_model) -> int:
+    """
+    将检测模型中的骨干/颈部模块替换为梯度检查点版本
+    
+    仅在模块处于训练状态且需要梯度时重算激活，推理与验证走原始forward。
+    
+    Args:
+        detection_model: Ultralytics 检测模型 (nn.Module)
+        
+    Returns:
+        启用检查点的模块数量
+    """
+    from torch.utils.checkpoint import checkpoint
+    import torch
+    
+    def _wrap(module):
+        forward = module.forward
+        
+        def checkpointed_forward(*args, **kwargs):
+            if module.training and torch.is_grad_enabled():
+                return checkpoint(forward, *args, use_reentrant=False, **kwargs)
+            return forward(*args, **kwargs)
+        
+        module.forward = checkpointed_forward
+    
+    wrapped = 0
+    for layer in getattr(detection_model, 'model', []):
+        if type(layer).__name__ in CHECKPOINT_BLOCK_TYPES:
+            _wrap(layer)
+            wrapped += 1
+    return wrapped
+
+
+def enable_gradient_checkpointing(model) -> None:
+    """
+    为训练模型的骨干/颈部模块注册梯度检查点
+    
+    训练器会重新构建模型，因此在训练器准备完成后替换训练器模型中各模块的
+    forward，EMA模型不受影响。
+    
+    Args:
+        model: ultralytics.YOLO 实例
+    """
+    def _checkpoint_trainer_model(trainer):
+        wrapped = checkpoint_blocks(trainer.model)
+        logger.info(f"梯度检查点已启用: {wrapped} 个模块")
+    
+    model.add_callback('on_pretrain_routine_end', _checkpoint_trainer_model)
+
+
+def enable_channels_last(model) -> bool:
+    """
+    训练模型与输入批次使用channels-last (NHWC) 内存布局
+    
+    Tensor Core卷积内核以NHWC为原生布局，NCHW输入需在内核前后转置。
+    训练器准备完成后转换训练模型与EMA模型的权重，并在预处理后转换图像批次。
+    
+    Args:
+        model: ultralytics.YOLO 实例
+        
+    Returns:
+        是否已启用
+    """
+    import torch
+    
+    if not torch.cuda.is_available():
+        logger.warning("未检测到CUDA，跳过 channels-last")
+        return False
+    if torch.cuda.get_device_capability()[0] < 7:
+        logger.warning("显卡计算能力低于 7.0，无Tensor Core卷积内核，跳过 channels-last")
+        return False
+    
+    def _channels_last_trainer(trainer):
+        trainer.model.to(memory_format=torch.channels_last)
+        if trainer.ema is not None:
+            trainer.ema.ema.to(memory_format=torch.channels_last)
+        
+        preprocess_batch = trainer.preprocess_batch
+        
+        def _preprocess_channels_last(batch):
+            batch = preprocess_batch(batch)
+            batch['img'] = batch['img'].contiguous(memory_format=torch.channels_last)
+            return batch
+        
+        trainer.preprocess_batch = _preprocess_channels_last
+        logger.info("channels-last 内存布局已启用")
+    
+    model.add_callback('on_pretrain_routine_end', _channels_last_trainer)
+    return True
+
+
+def measure_vram(model, config, precision='fp16', gradient_checkpointing=False):
+    """
+    以目标形状执行一次前向+反向，实测训练峰值显存
+    
+    在模型副本上运行，不影响随后训练使用的权重；不包含优化器状态。
+    
+    Args:
+        model: ultralytics.YOLO 实例
+        config: 训练配置
+        precision: 混合精度类型 (fp16/bf16/fp32)
+        gradient_checkpointing: 是否启用梯度检查点
+        
+    Returns:
+        峰值显存(GB)，CUDA不可用或测量失败时返回None
+    """
+    import copy
+    import torch
+    
+    if not torch.cuda.is_available():
+        return None
+    
+    probe = None
+    try:
+        probe = copy.deepcopy(model.model).cuda().float().train()
+        for param in probe.parameters():
+            param.requires_grad_(True)
+        if gradient_checkpointing:
+            checkpoint_blocks(probe)
+        
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats()
+        x = torch.randn(config['batch'], 3, config['imgsz'], config['imgsz'], device='cuda')
+        dtype = torch.bfloat16 if precision == 'bf16' else torch.float16
+        with torch.autocast(device_type='cuda', dtype=dtype, enabled=precision != 'fp32'):
+            outputs = probe(x)
+        if isinstance(outputs, torch.Tensor):
+            outputs = [outputs]
+        loss = sum(out.float().sum() for out in outputs)
+        loss.backward()
+        torch.cuda.synchronize()
+        return torch.cuda.max_memory_allocated() / 1024 ** 3
+    except Exception as e:
+        logger.warning(f"显存实测失败，沿用估算值: {e}")
+        return None
+    finally:
+        del probe
+        torch.cuda.empty_cache()
+
+
+def report_vram(vram_gb, source):
+    """输出显存使用评估"""
+    logger.info("%s显存使用: ~%.1f GB", source, vram_gb)
+    if vram_gb > VRAM_WARN_GB:
+        logger.warning("⚠️ 预估显存可能超出6GB限制，建议使用更激进的配置\n"
+                       "   尝试: --preset aggressive 或减小 --batch-size")
+    else:
+        logger.info("✓ 显存使用在安全范围内")
+
+
+def enable_torch_compile(model) -> bool:
+    """
+    为训练模型注册 torch.compile
+    
+    Ultralytics 训练器会按配置重新构建模型并加载权重，因此不能直接编译
+    model.model，而是在训练器准备完成后原地编译训练器中的模型
+    （nn.Module.compile 不改变模块类型与 state_dict 键名，检查点保存不受影响）。
+    
+    Args:
+        model: ultralytics.YOLO 实例
+        
+    Returns:
+        是否已启用
+    """
+    import torch
+    
+    if not torch.cuda.is_available():
+        logger.warning("未检测到CUDA，跳过 torch.compile")
+        return False
+    if torch.cuda.get_device_capability()[0] < 8:
+        logger.warning("显卡计算能力低于 8.0，reduce-overhead 模式不可用，跳过 torch.compile")
+        return False
+    if not hasattr(torch.nn.Module, 'compile'):
+        logger.warning("当前PyTorch版本不支持 nn.Module.compile (需要 2.2+)，跳过 torch.compile")
+        return False
+    
+    def _compile_trainer_model(trainer):
+        # imgsz 固定，使用静态形状让 Inductor 针对具体尺寸生成融合内核
+        trainer.model.compile(mode='reduce-overhead', fullgraph=False, dynamic=False)
+        logger.info("torch.compile 已启用 (mode=reduce-overhead)")
+    
+    model.add_callback('on_pretrain_routine_end', _compile_trainer_model)
+    return True
+
+
+def enable_fast_cuda_kernels(deterministic: bool) -> None:
+    """
+    启用cuDNN自动调优与TF32矩阵乘
+    
+    imgsz在一次训练中固定，cuDNN按输入形状测速一次并缓存最快的卷积算法；
+    TF32让AMP之外仍以FP32计算的矩阵乘（如损失计算）使用Tensor Core。
+    确定性模式下自动调优可能选出非确定性算法，因此不启用。
+    
+    Args:
+        deterministic: 是否要求确定性训练
+    """
+    import torch
+    
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.set_float32_matmul_precision('high')
+    if not deterministic:
+        torch.backends.cudnn.benchmark = True
+
+
+# INT8训练后量化导出: 命令行格式 -> (Ultralytics导出格式, 所需Python包)
+INT8_EXPORT_FORMATS = MappingProxyType({
+    'int8': ('openvino', 'openvino'),
+    'int8-trt': ('engine', 'tensorrt'),
+})
+
+# TensorRT构建工作区(GB)，适配6GB显存
+TRT_WORKSPACE_GB = 4
+
+
+def build_export_args(export_format, imgsz, data_path):
+    """
+    构建模型导出参数
+    
+    FP格式以FP16导出；INT8格式由Ultralytics从数据集验证集抽取图像做
+    训练后量化校准。引擎按训练的imgsz固定输入形状。
+    
+    Args:
+        export_format: 命令行指定的导出格式
+        imgsz: 训练图像尺寸
+        data_path: 数据集配置文件路径（INT8校准用）
+        
+    Returns:
+        model.export 的参数字典，所需后端未安装时返回None
+    """
+    import importlib.util
+    
+    if export_format in INT8_EXPORT_FORMATS:
+        fmt, package = INT8_EXPORT_FORMATS[export_format]
+        if importlib.util.find_spec(package) is None:
+            logger.error(f"INT8导出需要 {package}，请先安装: pip install {package}")
+            return None
+        export_args = {'format': fmt, 'imgsz': imgsz, 'int8': True, 'data': data_path}
+    else:
+        fmt = export_format
+        export_args = {'format': fmt, 'imgsz': imgsz, 'half': True}
+    
+    if fmt in ('tensorrt', 'engine'):
+        export_args['workspace'] = TRT_WORKSPACE_GB
+    return export_args
+
+
+def release_cuda_cache() -> None:
+    """将缓存分配器中的空闲显存块归还驱动，减少训练开始前的碎片"""
+    import torch
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.empty_cache()
+
+
+def log_cuda_memory_summary() -> None:
+    """输出CUDA缓存分配器摘要，用于区分显存总量不足与碎片问题"""
+    try:
+        import torch
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            logger.error("CUDA显存分配摘要:\n" + torch.cuda.memory_summary(abbreviated=True))
+    except Exception as e:
+        logger.warning(f"获取显存摘要失败: {e}")
+
+
 def main():
     """主函数"""
     args = parse_args()
+    os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', CUDA_ALLOC_CONF)
+    # Ultralytics 在导入时读取 PIN_MEMORY 环境变量（默认开启锁页内存），须在导入前设置
+    if args.no_pin_memory:
+        os.environ['PIN_MEMORY'] = 'False'
     
     # 验证数据文件
-    data_path = Path(args.data)
-    if not data_path.exists():
-        logger.error(f"数据配置文件不存在: {args.data}")
+    data_path = os.fspath(args.data)
+    if not os.path.exists(data_path):
+        logger.error(f"数据配置文件不存在: {data_path}")
         sys.exit(1)
     
     # 获取优化配置
     config, preset_desc = get_optimized_config(args)
     
-    # 打印配置摘要
-    print_config_summary(config, preset_desc, args.data)
-    
-    # 估算显存使用
-    estimated_vram = estimate_vram_usage(config)
-    logger.info(f"预估显存使用: ~{estimated_vram:.1f} GB")
-    if estimated_vram > 5.5:
-        logger.warning("⚠️ 预估显存可能超出6GB限制，建议使用更激进的配置")
-        logger.warning("   尝试: --preset aggressive 或减小 --batch-size")
+    # 干运行不探测显卡：import torch 及CUDA初始化耗时数秒，'auto' 原样显示
+    if not config['amp']:
+        precision = 'fp32'
+    elif args.dry_run:
+        precision = args.precision
     else:
-        logger.info("✓ 显存使用在安全范围内")
+        precision = resolve_precision(args.precision)
+    
+    # 打印配置摘要
+    print_config_summary(config, preset_desc, data_path, precision)
+    
+    # 估算显存使用（训练前会在GPU上实测）；自动批次时由AutoBatch按显存比例确定，无需估算
+    if not is_auto_batch(config):
+        estimated_vram = estimate_vram_usage(config, gradient_checkpointing=args.checkpoint)
+        report_vram(estimated_vram, "预估")
     logger.info("=" * 70)
     
     # 干运行模式
@@ -333,9 +867,27 @@ def main():
             logger.info(f"加载预训练模型: {model_file}")
             model = YOLO(model_file)
         
+        if precision == 'bf16' and not enable_bf16_autocast(model):
+            precision = 'fp16'
+        # 以目标形状实测峰值显存
+        if not is_auto_batch(config):
+            measured_vram = measure_vram(model, config, precision, gradient_checkpointing=args.checkpoint)
+            if measured_vram is not None:
+                report_vram(measured_vram, "实测")
+        
+        enable_fast_cuda_kernels(config['deterministic'])
+        if args.checkpoint:
+            enable_gradient_checkpointing(model)
+        if args.channels_last:
+            enable_channels_last(model)
+        if args.compile:
+            enable_torch_compile(model)
+        # 释放模型加载与设置过程中缓存的临时显存块（自动批次时同样需要）
+        release_cuda_cache()
+        
         # 准备训练参数
         train_args = {k: v for k, v in config.items() if k != 'model'}
-        train_args['data'] = str(args.data)
+        train_args['data'] = data_path
         train_args['resume'] = args.resume
         
         # 开始训练
@@ -360,11 +912,10 @@ def main():
             if best_weights.exists():
                 logger.info(f"最佳权重: {best_weights}")
                 
-                # 验证
+                # 验证（model.train() 结束时已将 best.pt 载回 model，直接复用，避免重复反序列化）
                 if args.val:
                     logger.info("运行验证...")
-                    val_model = YOLO(str(best_weights))
-                    val_results = val_model.val(data=str(args.data))
+                    val_results = model.val(data=data_path)
                     
                     if hasattr(val_results, 'box'):
                         logger.info(f"验证结果:")
@@ -376,26 +927,26 @@ def main():
                 # 导出
                 if args.export:
                     logger.info(f"导出模型为 {args.export} 格式...")
-                    export_model = YOLO(str(best_weights))
-                    export_path = export_model.export(
-                        format=args.export,
-                        imgsz=config['imgsz'],
-                        half=True  # FP16导出
-                    )
-                    logger.info(f"模型已导出: {export_path}")
+                    export_args = build_export_args(args.export, config['imgsz'], data_path)
+                    if export_args is not None:
+                        export_path = model.export(**export_args)
+                        logger.info(f"模型已导出: {export_path}")
         
         logger.info("=" * 70)
         return 0
         
     except Exception as e:
         logger.error(f"训练失败: {e}")
-        if "CUDA out of memory" in str(e) or "OutOfMemoryError" in str(e):
-            logger.error("=" * 70)
-            logger.error("显存不足! 请尝试以下解决方案:")
-            logger.error("  1. python backend/presentation/cli/train_optimized_cli.py --data ... --preset aggressive")
-            logger.error("  2. python backend/presentation/cli/train_optimized_cli.py --data ... --batch-size 2 --img-size 416")
-            logger.error("  3. 关闭其他占用GPU的程序")
-            logger.error("=" * 70)
+        if "CUDA out of memory" in str(e) or type(e).__name__ == "OutOfMemoryError":
+            log_cuda_memory_summary()
+            logger.error("\n".join([
+                "=" * 70,
+                "显存不足! 请尝试以下解决方案:",
+                "  1. python backend/presentation/cli/train_optimized_cli.py --data ... --preset aggressive",
+                "  2. python backend/presentation/cli/train_optimized_cli.py --data ... --batch-size 2 --img-size 416",
+                "  3. 关闭其他占用GPU的程序",
+                "=" * 70,
+            ]))
         return 1
 
 
@@ -6,12 +6,32 @@ PySide6 实时课堂行为检测应用
 import sys
 import os
 import cv2
+import heapq
+import importlib.util
 import json
+import queue
+import threading
+import time
 import numpy as np
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Dict, List, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
 
 # 添加项目根目录到路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -48,6 +68,49 @@ ELECTRONIC_DEVICE_CLASSES = {
 # 后端 API 地址
 API_BASE_URL = "http://127.0.0.1:5000/api"
 
+# 是否在启动时导出TensorRT引擎（需要数分钟且阻塞窗口显示，默认关闭，只加载已有的引擎）
+TENSORRT_EXPORT = os.getenv('TENSORRT_EXPORT', '').lower() in ('1', 'true', 'yes')
+
+# 行为模型INT8量化的校准数据集（data.yaml）；设置后GPU上使用TensorRT INT8引擎，否则使用FP16
+INT8_CALIBRATION_DATA = os.getenv('INT8_CALIBRATION_DATA', '')
+
+# 中文标签字体候选路径
+LABEL_FONT_PATHS = [
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+]
+
+# YuNet 人脸检测模型（OpenCV Zoo），存在时替代Haar级联用于低头检测
+YUNET_MODEL_PATH = os.path.join(project_root, 'face_detection_yunet_2023mar.onnx')
+
+
+def _box_iou_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    批量计算两组边界框之间的IoU矩阵
+    
+    Args:
+        boxes1: 形状为(N, 4)的边界框数组 [x1, y1, x2, y2]
+        boxes2: 形状为(M, 4)的边界框数组 [x1, y1, x2, y2]
+        
+    Returns:
+        形状为(N, M)的IoU矩阵，无效框（宽或高不为正）所在行列为0
+    """
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    
+    size1 = boxes1[:, 2:] - boxes1[:, :2]
+    size2 = boxes2[:, 2:] - boxes2[:, :2]
+    area1 = size1[:, 0] * size1[:, 1]
+    area2 = size2[:, 0] * size2[:, 1]
+    union = area1[:, None] + area2[None, :] - inter
+    
+    valid = (size1 > 0).all(axis=1)[:, None] & (size2 > 0).all(axis=1)[None, :]
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=valid & (union > 0))
+    return np.clip(iou, 0.0, 1.0)
+
 
 @dataclass
 class Detection:
@@ -58,20 +121,39 @@ class Detection:
     confidence: float
     bbox: List[float]
     behavior_type: str
+    behavior_group: str = ''  # 统计用行为名称（电子设备的具体类型合并为"使用电子设备"），默认同 class_name_cn
+    
+    def __post_init__(self):
+        if not self.behavior_group:
+            self.behavior_group = self.class_name_cn
     
     def to_dict(self) -> Dict:
-        return asdict(self)
+        # 逐字段构造，避免 asdict 的反射与深拷贝；bbox 在下游只读，直接复用
+        return {
+            'class_id': self.class_id,
+            'class_name': self.class_name,
+            'class_name_cn': self.class_name_cn,
+            'confidence': self.confidence,
+            'bbox': self.bbox,
+            'behavior_type': self.behavior_type,
+        }
 
 
 # ==================== 去重功能相关类 ====================
 
+# 每个追踪对象保留的行为历史帧数
+BEHAVIOR_HISTORY_LEN = 10
+
+
 @dataclass
 class TrackedObject:
     """追踪对象 - 用于跟踪同一目标在连续帧之间的位置"""
     track_id: int                    # 追踪ID
     bbox: List[float]                # 当前边界框 [x1, y1, x2, y2]
     last_seen_frame: int             # 最后出现的帧号
-    behavior_history: List[int]      # 行为历史（class_id列表，最近N帧）
+    behavior_history: 'deque[int]' = field(  # 行为历史（class_id，最近N帧，超出自动淘汰最旧的）
+        default_factory=lambda: deque(maxlen=BEHAVIOR_HISTORY_LEN)
+    )
 
 
 @dataclass
@@ -80,18 +162,18 @@ class BehaviorState:
     track_id: int                    # 追踪ID
     behavior_class_id: int           # 当前行为类别ID
     behavior_name: str               # 行为名称
-    start_time: datetime             # 行为开始时间
-    last_update_time: datetime       # 最后更新时间
-    last_record_time: datetime       # 最后记录到数据库的时间
+    start_time: float                # 行为开始时间（time.monotonic()）
+    last_update_time: float          # 最后更新时间（time.monotonic()）
+    last_record_time: float          # 最后记录到数据库的时间（time.monotonic()）
     bbox: List[float]                # 位置信息
     
     def duration_seconds(self) -> float:
         """获取行为持续时间（秒）"""
-        return (datetime.now() - self.start_time).total_seconds()
+        return time.monotonic() - self.start_time
     
     def time_since_last_record(self) -> float:
         """获取距离上次记录的时间（秒）"""
-        return (datetime.now() - self.last_record_time).total_seconds()
+        return time.monotonic() - self.last_record_time
 
 
 @dataclass
@@ -136,59 +218,15 @@ class PositionTracker:
         self.max_lost_frames = max_lost_frames
         self.max_tracked_objects = max_tracked_objects
         self.tracked_objects: Dict[int, TrackedObject] = {}
+        # 追踪框矩阵（前 len(_track_ids) 行有效，按需倍增扩容），行顺序与 _track_ids 一致
+        self._track_boxes = np.empty((16, 4), dtype=np.float32)
+        self._track_ids: List[int] = []
+        self._track_rows: Dict[int, int] = {}  # track_id -> 行号
+        # (last_seen_frame, track_id) 最小堆，每次更新追加新条目，旧条目出堆时按 last_seen_frame 校验后丢弃
+        self._lru_heap: List[Tuple[int, int]] = []
         self.next_track_id = 1
         self.current_frame = 0
     
-    def _compute_iou(self, box1: List[float], box2: List[float]) -> float:
-        """
-        计算两个边界框的IoU（交并比）
-        
-        Args:
-            box1: 第一个边界框 [x1, y1, x2, y2]
-            box2: 第二个边界框 [x1, y1, x2, y2]
-            
-        Returns:
-            IoU值，范围[0, 1]
-        """
-        try:
-            x1_1, y1_1, x2_1, y2_1 = box1
-            x1_2, y1_2, x2_2, y2_2 = box2
-            
-            # 确保坐标有效
-            if x2_1 <= x1_1 or y2_1 <= y1_1 or x2_2 <= x1_2 or y2_2 <= y1_2:
-                return 0.0
-            
-            # 计算交集区域
-            inter_x1 = max(x1_1, x1_2)
-            inter_y1 = max(y1_1, y1_2)
-            inter_x2 = min(x2_1, x2_2)
-            inter_y2 = min(y2_1, y2_2)
-            
-            # 如果没有交集
-            if inter_x2 <= inter_x1 or inter_y2 <= inter_y1:
-                return 0.0
-            
-            # 计算交集面积
-            inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-            
-            # 计算两个框的面积
-            area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
-            area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
-            
-            # 计算并集面积
-            union_area = area1 + area2 - inter_area
-            
-            if union_area <= 0:
-                return 0.0
-            
-            # 计算IoU
-            iou = inter_area / union_area
-            return max(0.0, min(1.0, iou))  # 确保在[0, 1]范围内
-            
-        except Exception as e:
-            print(f"IoU计算错误: {e}")
-            return 0.0
-    
     def _match_detections(self, detections: List[Detection]) -> Dict[int, int]:
         """
         匹配检测结果与已追踪对象
@@ -200,58 +238,98 @@ class PositionTracker:
             Dict mapping detection index to track_id
         """
         matches = {}
-        used_track_ids = set()
         
         if not self.tracked_objects or not detections:
             return matches
         
+        track_ids = self._track_ids
+        det_boxes = np.array([det.bbox for det in detections], dtype=np.float32).reshape(-1, 4)
+        track_boxes = self._track_boxes[:len(track_ids)]
+        
         # 计算所有检测与追踪对象之间的IoU
-        iou_matrix = []
-        for det_idx, det in enumerate(detections):
-            row = []
-            for track_id, tracked in self.tracked_objects.items():
-                iou = self._compute_iou(det.bbox, tracked.bbox)
-                row.append((iou, track_id))
-            iou_matrix.append(row)
-        
-        # 贪婪匹配：按IoU从高到低匹配
-        for det_idx, row in enumerate(iou_matrix):
-            # 按IoU降序排序
-            sorted_matches = sorted(row, key=lambda x: x[0], reverse=True)
-            
-            for iou, track_id in sorted_matches:
-                if iou >= self.iou_threshold and track_id not in used_track_ids:
-                    matches[det_idx] = track_id
-                    used_track_ids.add(track_id)
-                    break
+        iou = _box_iou_matrix(det_boxes, track_boxes)
+        
+        if SCIPY_AVAILABLE:
+            # 匈牙利算法：低于阈值的候选对置0后求IoU总和最大的一一匹配，再剔除置0的配对
+            gated = np.where(iou >= self.iou_threshold, iou, 0.0)
+            det_indices, track_indices = linear_sum_assignment(gated, maximize=True)
+            for det_idx, track_idx in zip(det_indices.tolist(), track_indices.tolist()):
+                if iou[det_idx, track_idx] >= self.iou_threshold:
+                    matches[det_idx] = track_ids[track_idx]
+            return matches
+        
+        # 未安装scipy时退化为全局贪婪匹配：只考虑超过阈值的候选对，按IoU从高到低依次匹配
+        det_indices, track_indices = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[det_indices, track_indices], kind='stable')
+        det_used = np.zeros(len(detections), dtype=bool)
+        track_used = np.zeros(len(track_ids), dtype=bool)
+        
+        for det_idx, track_idx in zip(det_indices[order].tolist(), track_indices[order].tolist()):
+            if det_used[det_idx] or track_used[track_idx]:
+                continue
+            matches[det_idx] = track_ids[track_idx]
+            det_used[det_idx] = True
+            track_used[track_idx] = True
         
         return matches
     
+    def _add_track(self, tracked: TrackedObject):
+        """登记新的追踪对象，并在追踪框矩阵末尾追加一行"""
+        row = len(self._track_ids)
+        if row == len(self._track_boxes):
+            grown = np.empty((2 * row, 4), dtype=np.float32)
+            grown[:row] = self._track_boxes
+            self._track_boxes = grown
+        self._track_boxes[row] = tracked.bbox
+        self._track_ids.append(tracked.track_id)
+        self._track_rows[tracked.track_id] = row
+        self.tracked_objects[tracked.track_id] = tracked
+    
+    def _remove_track(self, track_id: int):
+        """移除追踪对象，用最后一行填补其在追踪框矩阵中的位置"""
+        del self.tracked_objects[track_id]
+        row = self._track_rows.pop(track_id)
+        last = len(self._track_ids) - 1
+        if row != last:
+            moved_id = self._track_ids[last]
+            self._track_boxes[row] = self._track_boxes[last]
+            self._track_ids[row] = moved_id
+            self._track_rows[moved_id] = row
+        self._track_ids.pop()
+    
+    def _pop_oldest(self) -> Optional[int]:
+        """
+        弹出最久未出现的追踪对象ID，跳过已失效的堆条目
+        
+        Returns:
+            track_id，堆为空时返回None
+        """
+        while self._lru_heap:
+            last_seen_frame, track_id = heapq.heappop(self._lru_heap)
+            tracked = self.tracked_objects.get(track_id)
+            if tracked is not None and tracked.last_seen_frame == last_seen_frame:
+                return track_id
+        return None
+    
     def _cleanup_lost_tracks(self):
         """清理丢失的追踪对象（超过max_lost_frames帧未出现）"""
-        lost_ids = []
-        for track_id, tracked in self.tracked_objects.items():
-            if self.current_frame - tracked.last_seen_frame > self.max_lost_frames:
-                lost_ids.append(track_id)
-        
-        for track_id in lost_ids:
-            del self.tracked_objects[track_id]
+        # 只查看堆顶，未过期时无需遍历全部追踪对象
+        expire_before = self.current_frame - self.max_lost_frames
+        while self._lru_heap and self._lru_heap[0][0] < expire_before:
+            last_seen_frame, track_id = heapq.heappop(self._lru_heap)
+            tracked = self.tracked_objects.get(track_id)
+            # 追踪对象之后再次出现过时，该条目已失效
+            if tracked is not None and tracked.last_seen_frame == last_seen_frame:
+                self._remove_track(track_id)
     
     def _enforce_memory_limit(self):
         """强制内存限制，移除最旧的追踪对象"""
-        if len(self.tracked_objects) > self.max_tracked_objects:
-            # 按最后出现帧号排序，移除最旧的
-            sorted_tracks = sorted(
-                self.tracked_objects.items(),
-                key=lambda x: x[1].last_seen_frame
-            )
-            
-            # 移除超出限制的对象
-            num_to_remove = len(self.tracked_objects) - self.max_tracked_objects
-            for i in range(num_to_remove):
-                track_id = sorted_tracks[i][0]
-                del self.tracked_objects[track_id]
-                print(f"内存保护：移除追踪对象 {track_id}")
+        while len(self.tracked_objects) > self.max_tracked_objects:
+            track_id = self._pop_oldest()
+            if track_id is None:
+                break
+            self._remove_track(track_id)
+            print(f"内存保护：移除追踪对象 {track_id}")
     
     def update(self, detections: List[Detection]) -> List[Tuple[int, Detection]]:
         """
@@ -277,11 +355,10 @@ class PositionTracker:
                 
                 # 更新追踪对象
                 tracked.bbox = det.bbox
+                self._track_boxes[self._track_rows[track_id]] = det.bbox
                 tracked.last_seen_frame = self.current_frame
                 tracked.behavior_history.append(det.class_id)
-                # 只保留最近10帧的行为历史
-                if len(tracked.behavior_history) > 10:
-                    tracked.behavior_history = tracked.behavior_history[-10:]
+                heapq.heappush(self._lru_heap, (self.current_frame, track_id))
                 
                 result.append((track_id, det))
             else:
@@ -289,12 +366,14 @@ class PositionTracker:
                 track_id = self.next_track_id
                 self.next_track_id += 1
                 
-                self.tracked_objects[track_id] = TrackedObject(
+                tracked = TrackedObject(
                     track_id=track_id,
                     bbox=det.bbox,
-                    last_seen_frame=self.current_frame,
-                    behavior_history=[det.class_id]
+                    last_seen_frame=self.current_frame
                 )
+                tracked.behavior_history.append(det.class_id)
+                self._add_track(tracked)
+                heapq.heappush(self._lru_heap, (self.current_frame, track_id))
                 
                 result.append((track_id, det))
         
@@ -309,6 +388,9 @@ class PositionTracker:
     def reset(self):
         """重置追踪器状态"""
         self.tracked_objects.clear()
+        self._track_ids.clear()
+        self._track_rows.clear()
+        self._lru_heap.clear()
         self.next_track_id = 1
         self.current_frame = 0
 
@@ -397,7 +479,7 @@ class DeduplicationEngine:
             detection: 检测结果
             recorded: 是否已记录到数据库
         """
-        now = datetime.now()
+        now = time.monotonic()
         
         if track_id not in self.behavior_states:
             # 创建新状态
@@ -407,7 +489,7 @@ class DeduplicationEngine:
                 behavior_name=detection.class_name_cn,
                 start_time=now,
                 last_update_time=now,
-                last_record_time=now if recorded else now,
+                last_record_time=now,
                 bbox=detection.bbox
             )
         else:
@@ -465,23 +547,61 @@ class DetectionThread(QThread):
     # COCO 人体类别ID
     PERSON_CLASS_ID = 0
     
+    # 解码线程与检测循环之间的帧队列长度
+    FRAME_QUEUE_SIZE = 3
+    
+    # 凑批等待时间上限（秒），超时后以已收到的帧推理
+    BATCH_TIMEOUT = 0.06
+    
+    # 推理批大小上限，也是TensorRT引擎动态批维度的上限
+    MAX_BATCH_SIZE = 4
+    
+    # 待发送API请求队列长度，队列满时丢弃新的检测结果
+    API_QUEUE_SIZE = 64
+    
+    # 关闭窗口时等待API请求发送完毕的最长时间（秒）
+    API_SHUTDOWN_TIMEOUT = 10.0
+    
+    # 模型输入尺寸（letterbox长边）
+    INPUT_SIZE = 640
+    
+    # 推理间隔上限（每N帧推理一次）
+    MAX_INFERENCE_STRIDE = 10
+    
+    # 头部区域高度超过该值时，Haar级联检测前先缩小一半
+    HAAR_DOWNSCALE_MIN_HEIGHT = 300
+    
+    # 人体框高度低于图像高度的该比例时才做翻转侧脸检测（仅对接近过滤阈值的目标补充检测）
+    PROFILE_FLIP_MAX_HEIGHT_RATIO = 0.45
+    
     def __init__(self):
         super().__init__()
         self.running = False
         self.cap = None
         self.model = None
         self.device_model = None
+        self.face_detector = None  # YuNet DNN人脸检测器（优先使用）
         self.face_cascade = None  # 人脸检测器
         self.profile_cascade = None  # 侧脸检测器
+        self.label_font = self._load_label_font()  # 中文标签字体，None时用cv2.putText
         self.confidence_threshold = 0.35
         self.source = 0
         self.device = 'cpu'
+        self.half = False  # GPU上使用FP16推理
+        self._device_stream = None  # 电子设备模型专用CUDA流
+        self._inference_pool = None  # 与行为模型并行执行电子设备模型推理的线程池
+        self._letterbox = None  # 两个模型共享输入时使用的letterbox变换
         self.session_id = None
         self.save_to_db = True
         self.save_interval = 30  # 每30帧保存一次
+        self.batch_size = 1  # 每次推理的帧数，1为逐帧推理（延迟最低）
+        self.inference_stride = 3  # 每N帧推理一次，中间帧沿用上次的检测结果
+        self._last_detections: List[Detection] = []
         self.frame_count = 0
         
         # 低头检测相关参数
+        self.enable_head_down = True  # 是否启用低头检测，关闭时不加载人脸检测器
+        self._face_detector_loaded = False  # 人脸检测器在首次需要时加载
         self.head_down_history = {}  # 记录每个人的低头历史 {person_id: [is_head_down, ...]}
         self.head_down_confirm_frames = 3  # 连续N帧确认才判定为低头
         self.head_down_min_confidence = 0.55  # 低头检测最低置信度
@@ -491,17 +611,26 @@ class DetectionThread(QThread):
         self.dedup_engine = DeduplicationEngine(default_cooldown=60.0)
         self.enable_deduplication = True  # 是否启用去重
         
+        # 后端API：复用keep-alive连接，保存请求由后台线程按序发送，不阻塞检测循环
+        self._api_session = requests.Session()
+        self._api_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._api_queue = queue.Queue(maxsize=self.API_QUEUE_SIZE)
+        self._api_thread = threading.Thread(target=self._api_worker, name='api-writer', daemon=True)
+        self._api_thread.start()
+        
         self._load_models()
-        self._load_face_detector()
     
     def _load_models(self):
         """加载 YOLO 模型"""
         try:
-            from ultralytics import YOLO
             import torch
             
             if torch.cuda.is_available():
                 self.device = 'cuda:0'
+                self.half = True
+                # 输入尺寸固定，cuDNN对每种形状测速一次后复用最快的卷积算法
+                torch.backends.cudnn.benchmark = True
+                torch.backends.cuda.matmul.allow_tf32 = True
                 print(f"使用 GPU: {torch.cuda.get_device_name(0)}")
             else:
                 self.device = 'cpu'
@@ -509,8 +638,7 @@ class DetectionThread(QThread):
             
             model_path = os.path.join(project_root, 'runs/detect/classroom_behavior_4050/weights/best.pt')
             if os.path.exists(model_path):
-                self.model = YOLO(model_path)
-                self.model.to(self.device)
+                self.model = self._load_yolo(model_path, int8_data=INT8_CALIBRATION_DATA)
                 print(f"已加载行为检测模型: {model_path}")
             
             device_model_paths = [
@@ -519,17 +647,112 @@ class DetectionThread(QThread):
             ]
             for path in device_model_paths:
                 if os.path.exists(path):
-                    self.device_model = YOLO(path)
-                    self.device_model.to(self.device)
+                    self.device_model = self._load_yolo(path)
                     print(f"已加载电子设备检测模型: {path}")
                     break
+            
+            # 两个模型都在GPU上时，电子设备模型在工作线程的独立CUDA流上推理，
+            # 与行为模型的推理及后处理重叠
+            if self.model is not None and self.device_model is not None and self.device != 'cpu':
+                self._device_stream = torch.cuda.Stream()
+                self._inference_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='device-model')
+            
+            if self.device != 'cpu':
+                self._warmup_predictors()
                     
         except Exception as e:
             print(f"加载模型失败: {e}")
             self.error_occurred.emit(f"加载模型失败: {e}")
     
+    def _load_yolo(self, weights_path: str, int8_data: str = ''):
+        """
+        加载YOLO模型，GPU上优先使用TensorRT引擎（FP16，或指定校准数据时为INT8）
+        
+        引擎保存在权重文件旁（FP16为同名 .engine，INT8为 _int8.engine）。
+        引擎不存在或早于权重文件时，仅在设置 TENSORRT_EXPORT 时重新导出，否则使用PyTorch推理；
+        未安装TensorRT或导出/加载失败时同样使用PyTorch推理。
+        
+        Args:
+            weights_path: .pt 权重文件路径
+            int8_data: INT8校准数据集配置文件路径，为空时导出FP16引擎
+            
+        Returns:
+            ultralytics.YOLO 实例
+        """
+        from ultralytics import YOLO
+        
+        model = YOLO(weights_path)
+        if self.device == 'cpu' or importlib.util.find_spec('tensorrt') is None:
+            model.to(self.device)
+            return model
+        
+        int8 = bool(int8_data) and os.path.exists(int8_data)
+        if int8_data and not int8:
+            print(f"INT8校准数据集不存在，使用FP16: {int8_data}")
+        precision = 'INT8' if int8 else 'FP16'
+        engine_path = os.path.splitext(weights_path)[0] + ('_int8.engine' if int8 else '.engine')
+        try:
+            if not os.path.exists(engine_path) or os.path.getmtime(engine_path) < os.path.getmtime(weights_path):
+                if not TENSORRT_EXPORT:
+                    print(f"未找到最新的TensorRT {precision}引擎，使用PyTorch推理"
+                          f"（设置环境变量 TENSORRT_EXPORT=1 后启动以导出）: {engine_path}")
+                    model.to(self.device)
+                    return model
+                print(f"正在导出TensorRT {precision}引擎（仅首次运行，需要数分钟）: {engine_path}")
+                precision_args = {'int8': True, 'data': int8_data} if int8 else {'half': True}
+                exported = model.export(format='engine', dynamic=True, batch=self.MAX_BATCH_SIZE,
+                                        device=0, verbose=False, **precision_args)
+                # Ultralytics总是导出为同名 .engine，INT8引擎改名以免与FP16引擎互相覆盖
+                os.replace(exported, engine_path)
+            engine_model = YOLO(engine_path, task=model.task)
+            print(f"使用TensorRT {precision}引擎: {engine_path}")
+            return engine_model
+        except Exception as e:
+            print(f"TensorRT引擎不可用，使用PyTorch推理: {e}")
+            model.to(self.device)
+            return model
+    
+    def _warmup_predictors(self):
+        """
+        用空白帧各推理一次，提前创建Ultralytics预测器（AutoBackend、半精度设置、CUDA上下文）
+        
+        预测器就绪后，共享预处理的张量可直接送入 predictor.model 并自行NMS，
+        跳过Ultralytics的预处理、Results构建及原图回拷。
+        """
+        dummy = np.zeros((self.INPUT_SIZE, self.INPUT_SIZE, 3), dtype=np.uint8)
+        for model in (self.model, self.device_model):
+            if model is None:
+                continue
+            try:
+                model(dummy, half=self.half, verbose=False)
+            except Exception as e:
+                print(f"模型预热失败: {e}")
+    
+    @staticmethod
+    def _load_label_font():
+        """加载绘制中文标签的字体，PIL不可用或找不到字体时返回None"""
+        if not PIL_AVAILABLE:
+            return None
+        for fp in LABEL_FONT_PATHS:
+            if os.path.exists(fp):
+                try:
+                    return ImageFont.truetype(fp, 16)
+                except Exception as e:
+                    print(f"加载字体失败 {fp}: {e}")
+        return None
+    
     def _load_face_detector(self):
-        """加载人脸检测器（用于低头检测）"""
+        """加载人脸检测器（用于低头检测），优先使用YuNet，不可用时使用Haar级联"""
+        if hasattr(cv2, 'FaceDetectorYN') and os.path.exists(YUNET_MODEL_PATH):
+            try:
+                # 输入尺寸在每次检测前按人体区域设置
+                self.face_detector = cv2.FaceDetectorYN.create(YUNET_MODEL_PATH, "", (320, 320), 0.6, 0.3, 5000)
+                print(f"YuNet人脸检测器加载成功: {YUNET_MODEL_PATH}")
+                return
+            except Exception as e:
+                print(f"加载YuNet人脸检测器失败，使用Haar级联: {e}")
+                self.face_detector = None
+        
         try:
             cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
             self.face_cascade = cv2.CascadeClassifier(cascade_path)
@@ -543,19 +766,36 @@ class DetectionThread(QThread):
             self.face_cascade = None
             self.profile_cascade = None
     
+    def _ensure_face_detector(self):
+        """首次进行低头检测时加载人脸检测器"""
+        if not self._face_detector_loaded:
+            self._face_detector_loaded = True
+            self._load_face_detector()
+    
+    @property
+    def has_face_detector(self) -> bool:
+        """是否有可用于低头检测的人脸检测器"""
+        return self.face_detector is not None or self.face_cascade is not None
+    
     def set_source(self, source):
         self.source = source
     
     def set_confidence(self, conf: float):
         self.confidence_threshold = conf
     
+    def set_batch_size(self, batch_size: int):
+        self.batch_size = min(max(1, batch_size), self.MAX_BATCH_SIZE)
+    
+    def set_inference_stride(self, stride: int):
+        self.inference_stride = min(max(1, stride), self.MAX_INFERENCE_STRIDE)
+    
     def set_save_to_db(self, save: bool):
         self.save_to_db = save
     
     def create_session(self, class_id: int = None) -> Optional[int]:
         """创建检测会话"""
         try:
-            response = requests.post(f"{API_BASE_URL}/detection/session/start", json={
+            response = self._api_session.post(f"{API_BASE_URL}/detection/session/start", json={
                 "class_id": class_id,
                 "source_type": "pyside6_realtime"
             }, timeout=5)
@@ -572,15 +812,48 @@ class DetectionThread(QThread):
     def end_session(self):
         """结束检测会话"""
         if self.session_id:
+            # 与保存请求走同一队列，保证会话在已排队的检测结果之后结束
             try:
-                requests.post(f"{API_BASE_URL}/detection/session/end", json={
-                    "session_id": self.session_id
-                }, timeout=5)
+                self._api_queue.put(("/detection/session/end", {"session_id": self.session_id}), timeout=5)
                 print(f"结束检测会话: {self.session_id}")
-            except Exception as e:
-                print(f"结束会话失败: {e}")
+            except queue.Full:
+                print("结束会话失败: 请求队列已满")
             self.session_id = None
     
+    def _api_worker(self):
+        """后台线程：按序发送队列中的API请求，收到 None 时退出"""
+        while True:
+            item = self._api_queue.get()
+            if item is None:
+                return
+            endpoint, payload = item
+            try:
+                self._api_session.post(f"{API_BASE_URL}{endpoint}", json=payload, timeout=5)
+            except Exception as e:
+                print(f"API请求失败 ({endpoint}): {e}")
+    
+    def shutdown(self, timeout: float = API_SHUTDOWN_TIMEOUT):
+        """
+        发送完队列中剩余的API请求（含结束会话）后停止发送线程
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        """
+        if not self._api_thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            # 停止信号排在已有请求之后，发送线程处理完全部请求后退出
+            self._api_queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("API请求队列已满，未发送的请求将丢失")
+            return
+        self._api_thread.join(max(0.0, deadline - time.monotonic()))
+        if self._api_thread.is_alive():
+            print(f"等待API请求发送超时，剩余约 {self._api_queue.qsize()} 个请求未发送")
+        else:
+            self._api_session.close()
+    
     def save_detection_result(self, detections: List[Detection]):
         """保存检测结果到数据库（带去重功能）"""
         if not self.save_to_db or not self.session_id:
@@ -647,25 +920,32 @@ class DetectionThread(QThread):
         """保存检测结果到API"""
         if not detections:
             return
-            
+        
+        # 单次遍历统计行为类型与行为名称（电子设备的具体类型合并统计）
+        type_counts = Counter()
+        behavior_summary = Counter()
+        for d in detections:
+            type_counts[d.behavior_type] += 1
+            behavior_summary[d.behavior_group] += 1
+        
         detection_data = {
             "session_id": self.session_id,
             "detections": [d.to_dict() for d in detections],
             "total_count": len(detections),
-            "warning_count": sum(1 for d in detections if d.behavior_type == 'warning'),
-            "normal_count": sum(1 for d in detections if d.behavior_type == 'normal'),
-            "behavior_summary": {},
+            "warning_count": type_counts['warning'],
+            "normal_count": type_counts['normal'],
+            "behavior_summary": dict(behavior_summary),
             "timestamp": datetime.now().isoformat()
         }
         
-        # 统计行为
-        for d in detections:
-            name = d.class_name_cn
-            if '使用电子设备' in name:
-                name = '使用电子设备'
-            detection_data["behavior_summary"][name] = detection_data["behavior_summary"].get(name, 0) + 1
-        
-        requests.post(f"{API_BASE_URL}/detection/save", json=detection_data, timeout=3)
+        try:
+            self._api_queue.put_nowait(("/detection/save", detection_data))
+        except queue.Full:
+            print("API请求队列已满，丢弃本次检测结果")
+    
+    def set_head_down_enabled(self, enabled: bool):
+        """设置是否启用低头检测"""
+        self.enable_head_down = enabled
     
     def set_deduplication_enabled(self, enabled: bool):
         """设置是否启用去重"""
@@ -690,7 +970,7 @@ class DetectionThread(QThread):
             tracked_detections = self.position_tracker.update(detections)
             
             # 统计当前活跃的唯一目标数量（按行为类型）
-            active_behavior_counts = {}
+            active_behavior_counts = Counter()
             
             for track_id, detection in tracked_detections:
                 # 判断是否应该记录（更新统计）
@@ -700,10 +980,7 @@ class DetectionThread(QThread):
                 self.dedup_engine.update_state(track_id, detection, should_record)
                 
                 # 统计当前活跃的行为（每个唯一目标只计一次）
-                behavior_name = detection.class_name_cn
-                if '使用电子设备' in behavior_name:
-                    behavior_name = '使用电子设备'
-                active_behavior_counts[behavior_name] = active_behavior_counts.get(behavior_name, 0) + 1
+                active_behavior_counts[detection.behavior_group] += 1
             
             # 清理不活跃的状态
             active_ids = {t[0] for t in tracked_detections}
@@ -713,7 +990,7 @@ class DetectionThread(QThread):
             self.dedup_stats_updated.emit(self.dedup_engine.get_stats())
             
             # 发送当前活跃行为统计
-            self.active_behaviors_updated.emit(active_behavior_counts)
+            self.active_behaviors_updated.emit(dict(active_behavior_counts))
             
         except Exception as e:
             print(f"去重追踪更新错误: {e}")
@@ -721,6 +998,7 @@ class DetectionThread(QThread):
     def run(self):
         self.running = True
         self.frame_count = 0
+        self._last_detections = []
         
         # 创建会话
         if self.save_to_db:
@@ -729,119 +1007,370 @@ class DetectionThread(QThread):
                 self.session_created.emit(session_id)
         
         # 打开视频源
-        if isinstance(self.source, str) and os.path.exists(self.source):
-            self.cap = cv2.VideoCapture(self.source)
-        else:
-            self.cap = cv2.VideoCapture(int(self.source) if str(self.source).isdigit() else 0)
+        self.cap = self._open_capture()
         
         if not self.cap.isOpened():
             self.error_occurred.emit("无法打开视频源")
             return
         
+        # 解码在独立线程中进行，与检测重叠
+        frame_queue = queue.Queue(maxsize=self.FRAME_QUEUE_SIZE)
+        reader = threading.Thread(target=self._reader_loop, args=(frame_queue,),
+                                  name='frame-reader', daemon=True)
+        reader.start()
+        
         frame_count = 0
-        start_time = datetime.now()
+        start_time = time.monotonic()
         
-        while self.running:
-            ret, frame = self.cap.read()
-            if not ret:
-                if isinstance(self.source, str):
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    continue
-                break
-            
-            detections = self._detect(frame)
-            annotated_frame = self._draw_detections(frame, detections)
-            self.frame_ready.emit(annotated_frame, detections)
-            
-            # 每帧都更新去重追踪（用于统计显示）
-            self.frame_count += 1
-            if self.enable_deduplication and detections:
-                self._update_dedup_tracking(detections)
+        ended = False
+        while self.running and not ended:
+            frames, ended = self._next_batch(frame_queue)
+            if not frames:
+                continue
             
-            # 定期保存到数据库
-            if self.save_to_db and self.frame_count % self.save_interval == 0:
-                self.save_detection_result(detections)
+            # 行为变化较慢（睡觉、低头持续数秒），只对每 inference_stride 帧中的一帧推理，
+            # 中间帧沿用上次的检测结果
+            stride = self.inference_stride
+            inferred = [i for i in range(len(frames)) if (self.frame_count + i) % stride == 0]
+            batch_detections = iter(self._detect_batch([frames[i] for i in inferred]) if inferred else ())
+            
+            for i, frame in enumerate(frames):
+                fresh = i in inferred
+                if fresh:
+                    self._last_detections = next(batch_detections)
+                detections = self._last_detections
+                annotated_frame = self._draw_detections(frame, detections)
+                self.frame_ready.emit(annotated_frame, detections)
+                
+                # 推理帧更新去重追踪（用于统计显示），沿用的结果不重复计入
+                self.frame_count += 1
+                if self.enable_deduplication and fresh and detections:
+                    self._update_dedup_tracking(detections)
+                
+                # 定期保存到数据库
+                if self.save_to_db and self.frame_count % self.save_interval == 0:
+                    self.save_detection_result(detections)
+                
+                frame_count += 1
             
-            frame_count += 1
-            elapsed = (datetime.now() - start_time).total_seconds()
+            elapsed = time.monotonic() - start_time
             if elapsed >= 1.0:
                 fps = frame_count / elapsed
                 self.fps_updated.emit(fps)
                 frame_count = 0
-                start_time = datetime.now()
+                start_time = time.monotonic()
         
         # 结束会话
         if self.save_to_db:
             self.end_session()
         
+        self.running = False
+        reader.join()
         if self.cap:
             self.cap.release()
     
+    def _next_batch(self, frame_queue: queue.Queue):
+        """
+        从帧队列中取出一批帧
+        
+        凑满 batch_size 帧或等待超过 BATCH_TIMEOUT 后返回已收到的帧。
+        
+        Args:
+            frame_queue: 解码线程填充的帧队列
+            
+        Returns:
+            (帧列表, 视频源是否已结束)
+        """
+        frames = []
+        deadline = None
+        while len(frames) < self.batch_size:
+            if deadline is None:
+                timeout = 0.5
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                frame = frame_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if frame is None:
+                return frames, True
+            frames.append(frame)
+            if deadline is None:
+                deadline = time.monotonic() + self.BATCH_TIMEOUT
+        return frames, False
+    
+    def _open_capture(self) -> cv2.VideoCapture:
+        """打开视频源，视频文件优先使用FFmpeg硬件解码"""
+        if isinstance(self.source, str) and os.path.exists(self.source):
+            cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG,
+                                   [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+            if cap.isOpened():
+                return cap
+            # 当前OpenCV构建不支持FFmpeg硬件解码时回退到默认后端
+            return cv2.VideoCapture(self.source)
+        return cv2.VideoCapture(int(self.source) if str(self.source).isdigit() else 0)
+    
+    def _reader_loop(self, frame_queue: queue.Queue):
+        """
+        解码线程：持续读取帧放入队列，读取结束时放入None
+        
+        视频文件在队列满时等待检测循环消费，保证不丢帧；摄像头在队列满时
+        丢弃最旧的帧，避免画面延迟累积。
+        
+        Args:
+            frame_queue: 与检测循环共享的有界帧队列
+        """
+        is_file = isinstance(self.source, str)
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                if is_file:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                frame = None
+            
+            while self.running:
+                try:
+                    if is_file:
+                        frame_queue.put(frame, timeout=0.5)
+                    else:
+                        frame_queue.put_nowait(frame)
+                    break
+                except queue.Full:
+                    if not is_file:
+                        try:
+                            frame_queue.get_nowait()
+                        except queue.Empty:
+                            pass
+            
+            if frame is None:
+                break
+    
+    def _prepare_inputs(self, frames: List[np.ndarray]):
+        """
+        在GPU上对一批帧做一次letterbox与归一化，供两个模型共享
+        
+        CPU推理、只有一个模型或帧尺寸不一致时返回原始帧，由Ultralytics各自预处理。
+        
+        Args:
+            frames: BGR图像列表
+            
+        Returns:
+            (模型输入, letterbox参数)：输入为BCHW RGB张量或原始帧列表；
+            letterbox参数为 (缩放比例, 左侧填充, 顶部填充)，未预处理时为None
+        """
+        if (self.device == 'cpu' or self.model is None or self.device_model is None
+                or len({frame.shape for frame in frames}) > 1):
+            return frames, None
+        
+        import torch
+        if self._letterbox is None:
+            from ultralytics.data.augment import LetterBox
+            self._letterbox = LetterBox(new_shape=(self.INPUT_SIZE, self.INPUT_SIZE), auto=True, stride=32)
+        
+        batch = np.stack([self._letterbox(image=frame) for frame in frames])
+        tensor = torch.from_numpy(batch).to(self.device)
+        # BHWC BGR uint8 -> BCHW RGB [0, 1]
+        tensor = tensor.permute(0, 3, 1, 2).flip(1).contiguous()
+        tensor = (tensor.half() if self.half else tensor.float()) / 255.0
+        
+        # 与 ultralytics.utils.ops.scale_boxes 相同的还原参数
+        h0, w0 = frames[0].shape[:2]
+        h1, w1 = batch.shape[1:3]
+        gain = min(h1 / h0, w1 / w0)
+        pad_x = round((w1 - w0 * gain) / 2 - 0.1)
+        pad_y = round((h1 - h0 * gain) / 2 - 0.1)
+        return tensor, (gain, pad_x, pad_y)
+    
+    @staticmethod
+    def _result_arrays(data, letterbox, frame_shape):
+        """
+        将单帧检测张量一次性拷贝为NumPy数组（SoA）
+        
+        Args:
+            data: 单帧检测张量，列为 [x1, y1, x2, y2, (track_id), conf, cls]（可为None）
+            letterbox: 共享预处理的letterbox参数，None表示坐标已是原始帧坐标
+            frame_shape: 原始帧形状
+            
+        Returns:
+            (xyxy (N,4) float32, conf (N,) float32, cls (N,) int64)
+        """
+        if data is None or len(data) == 0:
+            return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)
+        
+        # 整体拷贝一次到CPU
+        data = data.float().cpu().numpy()
+        xyxy = data[:, :4]
+        conf = data[:, -2]
+        cls = data[:, -1].astype(np.int64)
+        
+        if letterbox is not None:
+            # 与 ultralytics.utils.ops.scale_boxes 相同：去除填充、还原缩放并裁剪到图像范围
+            gain, pad_x, pad_y = letterbox
+            h, w = frame_shape[:2]
+            xyxy = xyxy - np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+            xyxy /= gain
+            np.clip(xyxy, 0, [w, h, w, h], out=xyxy)
+        return xyxy, conf, cls
+    
+    def _infer(self, model, source, conf: float):
+        """
+        单个模型推理一批输入
+        
+        输入为共享预处理张量且预测器已预热时，直接调用 predictor.model 并执行NMS，
+        不构建Results（也不把原图拷回CPU）；否则走Ultralytics常规预测流程。
+        
+        Args:
+            model: ultralytics.YOLO 实例
+            source: BCHW张量或原始帧列表
+            conf: 置信度阈值
+            
+        Returns:
+            每帧一个检测张量，列为 [x1, y1, x2, y2, (track_id), conf, cls]
+        """
+        if not isinstance(source, list) and model.predictor is not None:
+            import torch
+            try:
+                from ultralytics.utils.nms import non_max_suppression
+            except ImportError:  # ultralytics < 8.3.150
+                from ultralytics.utils.ops import non_max_suppression
+            with torch.inference_mode():
+                preds = model.predictor.model(source)
+                return non_max_suppression(preds, conf, 0.5)
+        
+        results = model(source, conf=conf, iou=0.5, half=self.half, verbose=False)
+        return [result.boxes.data if result.boxes is not None else None for result in results]
+    
+    def _predict_devices(self, source):
+        """电子设备/人体检测模型推理（启用并行推理时在工作线程的独立CUDA流上执行）"""
+        if self._device_stream is None:
+            return self._infer(self.device_model, source, 0.3)
+        
+        import torch
+        if isinstance(source, torch.Tensor):
+            # 共享输入张量在检测线程的流上生成，先等待其完成
+            self._device_stream.wait_stream(torch.cuda.default_stream())
+        with torch.cuda.stream(self._device_stream):
+            results = self._infer(self.device_model, source, 0.3)
+        # 结果张量由检测线程读取，返回前等待本流上的计算完成
+        self._device_stream.synchronize()
+        return results
+    
     def _detect(self, frame: np.ndarray) -> List[Detection]:
-        detections = []
-        person_boxes = []  # 人体边界框（用于低头检测）
+        return self._detect_batch([frame])[0]
+    
+    def _detect_batch(self, frames: List[np.ndarray]) -> List[List[Detection]]:
+        """
+        对一批帧执行检测，两个模型各推理一次整批
+        
+        Args:
+            frames: BGR图像列表
+            
+        Returns:
+            与frames一一对应的检测结果列表
+        """
+        try:
+            source, letterbox = self._prepare_inputs(frames)
+        except Exception as e:
+            print(f"共享预处理失败，回退到逐模型预处理: {e}")
+            source, letterbox = frames, None
+        
+        device_future = None
+        if self.device_model is not None and self._inference_pool is not None:
+            device_future = self._inference_pool.submit(self._predict_devices, source)
         
+        behavior_results = [None] * len(frames)
         if self.model is not None:
             try:
-                results = self.model(frame, conf=self.confidence_threshold, iou=0.5, verbose=False)
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            cls_id = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            xyxy = box.xyxy[0].tolist()
-                            
-                            if cls_id in BEHAVIOR_CLASSES:
-                                class_info = BEHAVIOR_CLASSES[cls_id]
-                                detections.append(Detection(
-                                    class_id=cls_id,
-                                    class_name=class_info['name'],
-                                    class_name_cn=class_info['cn_name'],
-                                    confidence=conf,
-                                    bbox=xyxy,
-                                    behavior_type=class_info['type']
-                                ))
+                behavior_results = self._infer(self.model, source, self.confidence_threshold)
             except Exception as e:
                 print(f"行为检测错误: {e}")
         
+        device_results = [None] * len(frames)
         if self.device_model is not None:
             try:
-                results = self.device_model(frame, conf=0.3, iou=0.5, verbose=False)
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            cls_id = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            xyxy = box.xyxy[0].tolist()
-                            
-                            # 检测电子设备 - 检查是否与已有检测框重叠
-                            if cls_id in ELECTRONIC_DEVICE_CLASSES:
-                                # 检查是否与已有行为检测框重叠
-                                if not self._is_overlapping(xyxy, detections, threshold=0.3):
-                                    device_name = ELECTRONIC_DEVICE_CLASSES[cls_id]
-                                    detections.append(Detection(
-                                        class_id=5,
-                                        class_name='using_electronic_devices',
-                                        class_name_cn=f'使用电子设备({device_name})',
-                                        confidence=conf,
-                                        bbox=xyxy,
-                                        behavior_type='warning'
-                                    ))
-                            
-                            # 检测人体（用于低头检测）
-                            if cls_id == self.PERSON_CLASS_ID and conf > 0.4:
-                                person_boxes.append(xyxy)
+                device_results = device_future.result() if device_future is not None \
+                    else self._predict_devices(source)
+            except Exception as e:
+                print(f"电子设备检测错误: {e}")
+        
+        return [
+            self._collect_detections(frame, behavior_result, device_result, letterbox)
+            for frame, behavior_result, device_result in zip(frames, behavior_results, device_results)
+        ]
+    
+    def _collect_detections(self, frame: np.ndarray, behavior_result, device_result,
+                            letterbox=None) -> List[Detection]:
+        """
+        汇总单帧的模型输出，补充低头检测并去重
+        
+        Args:
+            frame: BGR图像
+            behavior_result: 行为模型对该帧的检测张量（推理失败时为None）
+            device_result: 电子设备模型对该帧的检测张量（推理失败时为None）
+            letterbox: 共享预处理的letterbox参数，结果坐标需还原到原始帧；None表示已是原始帧坐标
+            
+        Returns:
+            该帧的检测结果列表
+        """
+        detections = []
+        person_boxes = []  # 人体边界框（用于低头检测）
+        
+        if behavior_result is not None:
+            try:
+                boxes, confs, cls_ids = self._result_arrays(behavior_result, letterbox, frame.shape)
+                for xyxy, conf, cls_id in zip(boxes.tolist(), confs.tolist(), cls_ids.tolist()):
+                    if cls_id in BEHAVIOR_CLASSES:
+                        class_info = BEHAVIOR_CLASSES[cls_id]
+                        detections.append(Detection(
+                            class_id=cls_id,
+                            class_name=class_info['name'],
+                            class_name_cn=class_info['cn_name'],
+                            confidence=conf,
+                            bbox=xyxy,
+                            behavior_type=class_info['type']
+                        ))
+            except Exception as e:
+                print(f"行为检测错误: {e}")
+        
+        # 已接受检测框的 (M, 4) 数组，供重叠检查一次性计算IoU，接受新检测时追加一行
+        existing_boxes = np.array([det.bbox for det in detections], dtype=np.float32).reshape(-1, 4)
+        
+        if device_result is not None:
+            try:
+                boxes, confs, cls_ids = self._result_arrays(device_result, letterbox, frame.shape)
+                for xyxy, conf, cls_id in zip(boxes.tolist(), confs.tolist(), cls_ids.tolist()):
+                    # 检测电子设备 - 检查是否与已有检测框重叠
+                    if cls_id in ELECTRONIC_DEVICE_CLASSES:
+                        # 检查是否与已有行为检测框重叠
+                        if not self._is_overlapping(xyxy, existing_boxes, threshold=0.3):
+                            existing_boxes = np.vstack((existing_boxes, np.asarray([xyxy], dtype=np.float32)))
+                            device_name = ELECTRONIC_DEVICE_CLASSES[cls_id]
+                            detections.append(Detection(
+                                class_id=5,
+                                class_name='using_electronic_devices',
+                                class_name_cn=f'使用电子设备({device_name})',
+                                confidence=conf,
+                                bbox=xyxy,
+                                behavior_type='warning',
+                                behavior_group=BEHAVIOR_CLASSES[5]['cn_name']
+                            ))
+                    
+                    # 检测人体（用于低头检测）
+                    if cls_id == self.PERSON_CLASS_ID and conf > 0.4:
+                        person_boxes.append(xyxy)
             except Exception as e:
                 print(f"电子设备检测错误: {e}")
         
         # 低头检测
-        if person_boxes and self.face_cascade is not None:
+        if person_boxes and self.enable_head_down:
             head_down_results = self._detect_head_down(frame, person_boxes, detections)
             for hd in head_down_results:
                 # 检查是否与已有检测框重叠
-                if not self._is_overlapping(hd['bbox'], detections, threshold=0.3):
+                if not self._is_overlapping(hd['bbox'], existing_boxes, threshold=0.3):
+                    existing_boxes = np.vstack((existing_boxes, np.asarray([hd['bbox']], dtype=np.float32)))
                     head_down_class_info = BEHAVIOR_CLASSES[7]  # head_down
                     detections.append(Detection(
                         class_id=7,
@@ -857,73 +1386,37 @@ class DetectionThread(QThread):
         
         return detections
     
-    def _is_overlapping(self, bbox: List[float], detections: List[Detection], threshold: float = 0.3) -> bool:
-        """检查边界框是否与已有检测框重叠"""
-        x1, y1, x2, y2 = bbox
-        box_area = (x2 - x1) * (y2 - y1)
+    def _is_overlapping(self, bbox: List[float], existing_boxes: np.ndarray, threshold: float = 0.3) -> bool:
+        """
+        检查边界框是否与已有检测框重叠
         
-        for det in detections:
-            dx1, dy1, dx2, dy2 = det.bbox
-            
-            # 计算交集
-            inter_x1 = max(x1, dx1)
-            inter_y1 = max(y1, dy1)
-            inter_x2 = min(x2, dx2)
-            inter_y2 = min(y2, dy2)
+        Args:
+            bbox: 待检查的边界框 [x1, y1, x2, y2]
+            existing_boxes: 已有检测框数组 (M, 4)
+            threshold: IoU阈值
             
-            if inter_x2 > inter_x1 and inter_y2 > inter_y1:
-                inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-                det_area = (dx2 - dx1) * (dy2 - dy1)
-                
-                # 计算IoU
-                union_area = box_area + det_area - inter_area
-                iou = inter_area / union_area if union_area > 0 else 0
-                
-                if iou > threshold:
-                    return True
-        
-        return False
+        Returns:
+            与任一已有检测框的IoU超过阈值时返回True
+        """
+        if len(existing_boxes) == 0:
+            return False
+        iou = _box_iou_matrix(np.asarray([bbox], dtype=np.float32), existing_boxes)
+        return bool((iou > threshold).any())
     
     def _remove_duplicate_detections(self, detections: List[Detection]) -> List[Detection]:
         """移除重叠的检测框，保留置信度最高的"""
         if len(detections) <= 1:
             return detections
         
-        # 按置信度降序排序
-        sorted_dets = sorted(detections, key=lambda x: x.confidence, reverse=True)
-        keep = []
+        # 按置信度降序做类别无关NMS（OpenCV C++实现）：
+        # 与已保留框IoU > 0.4 的认为是同一个人的重复检测
+        boxes = np.array([det.bbox for det in detections], dtype=np.float64)
+        boxes[:, 2:] -= boxes[:, :2]  # xyxy -> xywh
+        confidences = [det.confidence for det in detections]
+        keep = cv2.dnn.NMSBoxes(boxes.tolist(), confidences, score_threshold=0.0, nms_threshold=0.4)
         
-        for det in sorted_dets:
-            # 检查是否与已保留的检测框重叠
-            is_duplicate = False
-            for kept in keep:
-                x1, y1, x2, y2 = det.bbox
-                kx1, ky1, kx2, ky2 = kept.bbox
-                
-                # 计算交集
-                inter_x1 = max(x1, kx1)
-                inter_y1 = max(y1, ky1)
-                inter_x2 = min(x2, kx2)
-                inter_y2 = min(y2, ky2)
-                
-                if inter_x2 > inter_x1 and inter_y2 > inter_y1:
-                    inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-                    det_area = (x2 - x1) * (y2 - y1)
-                    kept_area = (kx2 - kx1) * (ky2 - ky1)
-                    
-                    # 计算IoU
-                    union_area = det_area + kept_area - inter_area
-                    iou = inter_area / union_area if union_area > 0 else 0
-                    
-                    # 如果IoU > 0.4，认为是同一个人的重复检测
-                    if iou > 0.4:
-                        is_duplicate = True
-                        break
-            
-            if not is_duplicate:
-                keep.append(det)
-        
-        return keep
+        # 返回的索引按置信度降序；不同OpenCV版本形状为 (K,) 或 (K, 1)
+        return [detections[idx] for idx in np.asarray(keep, dtype=np.int64).reshape(-1).tolist()]
     
     def _detect_head_down(self, image: np.ndarray, person_boxes: List[List[float]], 
                           existing_detections: List[Detection]) -> List[Dict]:
@@ -946,114 +1439,48 @@ class DetectionThread(QThread):
         """
         head_down_detections = []
         
-        if self.face_cascade is None:
+        if not self.enable_head_down or not person_boxes:
             return head_down_detections
         
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         h, w = image.shape[:2]
         
-        # 获取已检测到的行为区域（排除低头）
-        existing_boxes = []
-        if existing_detections:
-            for det in existing_detections:
-                # 排除已检测到的行为
-                if det.class_id in [0, 2, 3, 4, 5, 6]:
-                    existing_boxes.append(det.bbox)
+        # 先按尺寸过滤人体框，广角画面中常常没有符合条件的近距离目标，可直接返回
+        eligible_boxes = self._eligible_person_boxes(person_boxes, w, h)
+        if not eligible_boxes:
+            return head_down_detections
         
-        for person_box in person_boxes:
-            x1, y1, x2, y2 = [int(v) for v in person_box]
-            
-            # 确保坐标在图像范围内
-            x1 = max(0, x1)
-            y1 = max(0, y1)
-            x2 = min(w, x2)
-            y2 = min(h, y2)
-            
-            if x2 <= x1 or y2 <= y1:
-                continue
-            
+        self._ensure_face_detector()
+        if not self.has_face_detector:
+            return head_down_detections
+        
+        # 获取已检测到的行为区域（排除低头），整数化后构成 (M, 4) 数组
+        existing_boxes = np.array(
+            [det.bbox for det in existing_detections or () if det.class_id in (0, 2, 3, 4, 5, 6)],
+            dtype=np.float64
+        ).reshape(-1, 4).astype(np.int64)
+        
+        # 严格过滤条件4：人体框与任一已检测行为区域的交集超过人体框面积的15%时跳过
+        if len(existing_boxes):
+            persons = np.array(eligible_boxes, dtype=np.int64)
+            top_left = np.maximum(persons[:, None, :2], existing_boxes[None, :, :2])
+            bottom_right = np.minimum(persons[:, None, 2:], existing_boxes[None, :, 2:])
+            wh = np.clip(bottom_right - top_left, 0, None)
+            inter_area = wh[..., 0] * wh[..., 1]
+            person_area = (persons[:, 2] - persons[:, 0]) * (persons[:, 3] - persons[:, 1])
+            overlapped = (inter_area / person_area[:, None] > 0.15).any(axis=1)
+            eligible_boxes = [box for box, skip in zip(eligible_boxes, overlapped.tolist()) if not skip]
+        
+        for x1, y1, x2, y2 in eligible_boxes:
             person_height = y2 - y1
-            person_width = x2 - x1
-            
-            # 严格过滤条件1：只检测足够大的目标（近距离）
-            # 人体框必须占图像高度的30%以上
-            if person_height < h * 0.3:
-                continue
-            
-            # 严格过滤条件2：人体框必须足够大（绝对尺寸）
-            if person_height < 200 or person_width < 100:
-                continue
-            
-            # 严格过滤条件3：宽高比检查
-            aspect_ratio = person_width / person_height
-            if aspect_ratio > 1.2 or aspect_ratio < 0.25:
-                continue
-            
-            # 严格过滤条件4：检查是否与已检测行为区域重叠
-            skip_person = False
-            for eb in existing_boxes:
-                ex1, ey1, ex2, ey2 = [int(v) for v in eb]
-                inter_x1 = max(x1, ex1)
-                inter_y1 = max(y1, ey1)
-                inter_x2 = min(x2, ex2)
-                inter_y2 = min(y2, ey2)
-                
-                if inter_x2 > inter_x1 and inter_y2 > inter_y1:
-                    inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-                    person_area = (x2 - x1) * (y2 - y1)
-                    if inter_area / person_area > 0.15:
-                        skip_person = True
-                        break
-            
-            if skip_person:
-                continue
             
             # 在整个人体上半部分区域检测人脸（扩大检测范围到50%）
             head_y2 = y1 + int(person_height * 0.5)
-            person_region = gray[y1:head_y2, x1:x2]
-            
-            if person_region.size == 0:
-                continue
-            
-            # 使用更宽松的参数检测人脸（减少漏检）
-            faces = self.face_cascade.detectMultiScale(
-                person_region,
-                scaleFactor=1.1,
-                minNeighbors=3,  # 降低以提高检测率
-                minSize=(20, 20),
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
             
             # 如果检测到人脸，说明不是低头
-            if len(faces) > 0:
+            check_flipped = person_height < h * self.PROFILE_FLIP_MAX_HEIGHT_RATIO
+            if self._face_visible(image, x1, y1, x2, head_y2, check_flipped):
                 continue
             
-            # 尝试检测侧脸
-            if self.profile_cascade is not None:
-                profiles = self.profile_cascade.detectMultiScale(
-                    person_region,
-                    scaleFactor=1.1,
-                    minNeighbors=3,
-                    minSize=(20, 20),
-                    flags=cv2.CASCADE_SCALE_IMAGE
-                )
-                
-                if len(profiles) > 0:
-                    continue
-                
-                # 翻转检测另一侧
-                flipped = cv2.flip(person_region, 1)
-                profiles_flip = self.profile_cascade.detectMultiScale(
-                    flipped,
-                    scaleFactor=1.1,
-                    minNeighbors=3,
-                    minSize=(20, 20),
-                    flags=cv2.CASCADE_SCALE_IMAGE
-                )
-                
-                if len(profiles_flip) > 0:
-                    continue
-            
             # 所有人脸检测都失败，判定为低头
             # 置信度基于人体框大小
             confidence = 0.6 + (person_height / h) * 0.2
@@ -1067,7 +1494,109 @@ class DetectionThread(QThread):
         
         return head_down_detections
     
+    @staticmethod
+    def _eligible_person_boxes(person_boxes: List[List[float]], w: int, h: int) -> List[Tuple[int, int, int, int]]:
+        """
+        按尺寸与宽高比过滤可用于低头检测的人体框
+        
+        Args:
+            person_boxes: 人体边界框列表
+            w: 图像宽度
+            h: 图像高度
+            
+        Returns:
+            通过过滤的整数边界框 (x1, y1, x2, y2) 列表，坐标已裁剪到图像范围内
+        """
+        boxes = np.array(person_boxes, dtype=np.float64).reshape(-1, 4).astype(np.int64)
+        # 确保坐标在图像范围内
+        np.clip(boxes, 0, [w, h, w, h], out=boxes)
+        widths = boxes[:, 2] - boxes[:, 0]
+        heights = boxes[:, 3] - boxes[:, 1]
+        
+        keep = (widths > 0) & (heights > 0)
+        # 严格过滤条件1：只检测足够大的目标（近距离），人体框必须占图像高度的30%以上
+        keep &= heights >= h * 0.3
+        # 严格过滤条件2：人体框必须足够大（绝对尺寸）
+        keep &= (heights >= 200) & (widths >= 100)
+        # 严格过滤条件3：宽高比检查
+        aspect_ratio = np.divide(widths, heights, out=np.zeros(len(boxes)), where=heights > 0)
+        keep &= (aspect_ratio <= 1.2) & (aspect_ratio >= 0.25)
+        
+        return [tuple(box) for box in boxes[keep].tolist()]
+    
+    def _face_visible(self, image: np.ndarray, x1: int, y1: int, x2: int, y2: int,
+                      check_flipped: bool = True) -> bool:
+        """
+        检查区域内是否能检测到人脸（正脸或侧脸）
+        
+        Args:
+            image: BGR图像
+            x1, y1, x2, y2: 检测区域
+            check_flipped: Haar级联是否再检测水平翻转后的侧脸
+            
+        Returns:
+            是否检测到人脸，区域为空时返回True（不判定为低头）
+        """
+        if x2 <= x1 or y2 <= y1:
+            return True
+        
+        if self.face_detector is not None:
+            region = image[y1:y2, x1:x2]
+            self.face_detector.setInputSize((x2 - x1, y2 - y1))
+            _, faces = self.face_detector.detect(region)
+            return faces is not None and len(faces) > 0
+        
+        # Haar级联只转换通过过滤的检测区域为灰度，而不是整帧
+        person_region = cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        
+        # 近距离目标的头部区域很大，缩小一半后扫描窗口数约为原来的1/4；
+        # 只判断是否存在人脸，不需要把坐标还原
+        min_size = (20, 20)
+        if person_region.shape[0] > self.HAAR_DOWNSCALE_MIN_HEIGHT:
+            person_region = cv2.resize(person_region, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+            min_size = (10, 10)
+        
+        # 使用更宽松的参数检测人脸（减少漏检）
+        faces = self.face_cascade.detectMultiScale(
+            person_region,
+            scaleFactor=1.1,
+            minNeighbors=3,  # 降低以提高检测率
+            minSize=min_size,
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        if len(faces) > 0:
+            return True
+        
+        # 尝试检测侧脸（仅作补充判断，使用更大的缩放步长减少金字塔层数）
+        if self.profile_cascade is not None:
+            profiles = self.profile_cascade.detectMultiScale(
+                person_region,
+                scaleFactor=1.2,
+                minNeighbors=2,
+                minSize=min_size,
+                flags=cv2.CASCADE_SCALE_IMAGE
+            )
+            if len(profiles) > 0:
+                return True
+            
+            # 翻转检测另一侧
+            if check_flipped:
+                flipped = cv2.flip(person_region, 1)
+                profiles_flip = self.profile_cascade.detectMultiScale(
+                    flipped,
+                    scaleFactor=1.2,
+                    minNeighbors=2,
+                    minSize=min_size,
+                    flags=cv2.CASCADE_SCALE_IMAGE
+                )
+                if len(profiles_flip) > 0:
+                    return True
+        
+        return False
+    
     def _draw_detections(self, frame: np.ndarray, detections: List[Detection]) -> np.ndarray:
+        # 先用cv2画出所有边框和标签底色，再一次性绘制全部文字
+        labels = []
         for det in detections:
             x1, y1, x2, y2 = [int(v) for v in det.bbox]
             
@@ -1083,31 +1612,22 @@ class DetectionThread(QThread):
             label = f"{det.class_name_cn} {det.confidence:.2f}"
             (label_w, label_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
             cv2.rectangle(frame, (x1, y1 - label_h - 10), (x1 + label_w + 10, y1), color_bgr, -1)
-            
-            try:
-                from PIL import Image, ImageDraw, ImageFont
-                pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                draw = ImageDraw.Draw(pil_img)
-                
-                font = None
-                font_paths = [
-                    "C:/Windows/Fonts/msyh.ttc",
-                    "C:/Windows/Fonts/simhei.ttf",
-                    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-                ]
-                for fp in font_paths:
-                    if os.path.exists(fp):
-                        font = ImageFont.truetype(fp, 16)
-                        break
-                
-                if font:
-                    draw.text((x1 + 5, y1 - label_h - 8), label, fill=(255, 255, 255), font=font)
-                    frame = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-                else:
-                    cv2.putText(frame, label, (x1 + 5, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            except:
-                cv2.putText(frame, label, (x1 + 5, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            labels.append((label, x1, y1, label_h))
         
+        if not labels:
+            return frame
+        
+        if self.label_font is None:
+            for label, x1, y1, _ in labels:
+                cv2.putText(frame, label, (x1 + 5, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            return frame
+        
+        # 文字为白色，与通道顺序无关，直接在BGR数据上绘制，无需颜色转换
+        pil_img = Image.fromarray(frame)
+        draw = ImageDraw.Draw(pil_img)
+        for label, x1, y1, label_h in labels:
+            draw.text((x1 + 5, y1 - label_h - 8), label, fill=(255, 255, 255), font=self.label_font)
+        frame[:] = np.asarray(pil_img)
         return frame
     
     def stop(self):
@@ -1236,6 +1756,28 @@ class MainWindow(QMainWindow):
         conf_layout.addWidget(self.conf_label)
         settings_layout.addLayout(conf_layout)
         
+        # 推理批大小
+        batch_layout = QHBoxLayout()
+        batch_layout.addWidget(QLabel("推理批大小:"))
+        self.batch_spin = QSpinBox()
+        self.batch_spin.setRange(1, DetectionThread.MAX_BATCH_SIZE)
+        self.batch_spin.setValue(1)
+        self.batch_spin.setToolTip("每次推理的帧数，增大可提高吞吐，但画面延迟增加")
+        self.batch_spin.valueChanged.connect(self.detection_thread.set_batch_size)
+        batch_layout.addWidget(self.batch_spin)
+        settings_layout.addLayout(batch_layout)
+        
+        # 推理间隔
+        stride_layout = QHBoxLayout()
+        stride_layout.addWidget(QLabel("推理间隔(帧):"))
+        self.stride_spin = QSpinBox()
+        self.stride_spin.setRange(1, DetectionThread.MAX_INFERENCE_STRIDE)
+        self.stride_spin.setValue(self.detection_thread.inference_stride)
+        self.stride_spin.setToolTip("每N帧推理一次，中间帧沿用上次的检测结果；1为逐帧推理")
+        self.stride_spin.valueChanged.connect(self.detection_thread.set_inference_stride)
+        stride_layout.addWidget(self.stride_spin)
+        settings_layout.addLayout(stride_layout)
+        
         # 保存到数据库选项
         self.save_db_checkbox = QCheckBox("保存检测结果到数据库")
         self.save_db_checkbox.setChecked(True)
@@ -1247,6 +1789,12 @@ class MainWindow(QMainWindow):
         self.dedup_checkbox.stateChanged.connect(self.update_deduplication)
         settings_layout.addWidget(self.dedup_checkbox)
         
+        # 低头检测选项
+        self.head_down_checkbox = QCheckBox("启用低头检测")
+        self.head_down_checkbox.setChecked(self.detection_thread.enable_head_down)
+        self.head_down_checkbox.toggled.connect(self.detection_thread.set_head_down_enabled)
+        settings_layout.addWidget(self.head_down_checkbox)
+        
         # 冷却期配置
         cooldown_layout = QHBoxLayout()
         cooldown_layout.addWidget(QLabel("冷却期:"))
@@ -1271,9 +1819,13 @@ class MainWindow(QMainWindow):
         self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.stats_table.setRowCount(len(BEHAVIOR_CLASSES))
         
+        # 计数单元格只创建一次，之后只更新文字
+        self._stats_count_items = []
         for i, (cls_id, info) in enumerate(BEHAVIOR_CLASSES.items()):
             self.stats_table.setItem(i, 0, QTableWidgetItem(info['cn_name']))
-            self.stats_table.setItem(i, 1, QTableWidgetItem("0"))
+            count_item = QTableWidgetItem("0")
+            self.stats_table.setItem(i, 1, count_item)
+            self._stats_count_items.append(count_item)
         
         stats_layout.addWidget(self.stats_table)
         
@@ -1292,6 +1844,10 @@ class MainWindow(QMainWindow):
         self.current_table.setHorizontalHeaderLabels(["行为", "置信度", "类型"])
         self.current_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         current_layout.addWidget(self.current_table)
+        # 每行的单元格按需创建后复用；多余的行隐藏而不删除（删除行会销毁其单元格）
+        self._current_items: List[List[QTableWidgetItem]] = []
+        self._warning_color = QColor("#F56C6C")
+        self._normal_color = QColor("#67C23A")
         
         right_layout.addWidget(current_group)
         
@@ -1392,20 +1948,17 @@ class MainWindow(QMainWindow):
             }
         """)
     
-    @Slot(np.ndarray, list)
-    def update_frame(self, frame: np.ndarray, detections: List[Detection]):
-        # 转换BGR到RGB并确保内存连续
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        rgb_frame = np.ascontiguousarray(rgb_frame)
-        
-        h, w, ch = rgb_frame.shape
-        bytes_per_line = ch * w
-        
-        # 使用RGB格式创建QImage
-        qt_image = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
+    def _show_frame(self, frame: np.ndarray):
+        """
+        在视频区域显示BGR图像
         
-        # 复制图像数据避免内存问题
-        pixmap = QPixmap.fromImage(qt_image.copy())
+        QImage直接引用ndarray内存并按BGR888解释，不做颜色转换和额外拷贝；
+        QPixmap.fromImage 会复制像素，返回后不再引用 frame。
+        """
+        frame = np.ascontiguousarray(frame)
+        h, w = frame.shape[:2]
+        qt_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+        pixmap = QPixmap.fromImage(qt_image)
         
         scaled_pixmap = pixmap.scaled(
             self.video_label.size(),
@@ -1413,21 +1966,45 @@ class MainWindow(QMainWindow):
             Qt.SmoothTransformation
         )
         self.video_label.setPixmap(scaled_pixmap)
+    
+    @Slot(np.ndarray, list)
+    def update_frame(self, frame: np.ndarray, detections: List[Detection]):
+        self._show_frame(frame)
         
         # 注意：behavior_stats 现在由 update_active_behaviors 更新
         # 显示当前活跃的唯一目标数量，而不是累计次数
         
-        self.current_table.setRowCount(len(detections))
+        self._update_current_table(detections)
+    
+    def _update_current_table(self, detections: List[Detection]):
+        """更新当前帧检测表，复用已有单元格，只修改文字和颜色"""
+        table = self.current_table
+        for i in range(len(self._current_items), len(detections)):
+            table.setRowCount(i + 1)
+            items = [QTableWidgetItem("") for _ in range(3)]
+            for col, item in enumerate(items):
+                table.setItem(i, col, item)
+            self._current_items.append(items)
+        
         for i, det in enumerate(detections):
-            self.current_table.setItem(i, 0, QTableWidgetItem(det.class_name_cn))
-            self.current_table.setItem(i, 1, QTableWidgetItem(f"{det.confidence:.2f}"))
-            
-            type_item = QTableWidgetItem("⚠️ 预警" if det.behavior_type == 'warning' else "✅ 正常")
+            name_item, conf_item, type_item = self._current_items[i]
+            name_item.setText(det.class_name_cn)
+            conf_item.setText(f"{det.confidence:.2f}")
             if det.behavior_type == 'warning':
-                type_item.setForeground(QColor("#F56C6C"))
+                type_item.setText("⚠️ 预警")
+                type_item.setForeground(self._warning_color)
             else:
-                type_item.setForeground(QColor("#67C23A"))
-            self.current_table.setItem(i, 2, type_item)
+                type_item.setText("✅ 正常")
+                type_item.setForeground(self._normal_color)
+            table.setRowHidden(i, False)
+        
+        for i in range(len(detections), len(self._current_items)):
+            table.setRowHidden(i, True)
+    
+    def _update_stats_table(self):
+        """按 behavior_stats 更新统计表的计数列"""
+        for count_item, info in zip(self._stats_count_items, BEHAVIOR_CLASSES.values()):
+            count_item.setText(str(self.behavior_stats.get(info['cn_name'], 0)))
     
     @Slot(float)
     def update_fps(self, fps: float):
@@ -1484,9 +2061,7 @@ class MainWindow(QMainWindow):
                 self.behavior_stats[behavior_name] = count
         
         # 更新统计表格显示
-        for i, (cls_id, info) in enumerate(BEHAVIOR_CLASSES.items()):
-            count = self.behavior_stats.get(info['cn_name'], 0)
-            self.stats_table.setItem(i, 1, QTableWidgetItem(str(count)))
+        self._update_stats_table()
     
     def start_detection(self):
         source = self.camera_combo.currentIndex()
@@ -1543,51 +2118,17 @@ class MainWindow(QMainWindow):
             
             # 绘制检测结果
             annotated_image = self.detection_thread._draw_detections(image.copy(), detections)
-            
-            # 转换为RGB格式并创建QImage
-            # 使用 .copy() 确保数据连续，避免内存问题
-            rgb_image = cv2.cvtColor(annotated_image, cv2.COLOR_BGR2RGB)
-            rgb_image = np.ascontiguousarray(rgb_image)
-            
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            
-            # 创建QImage时使用RGB格式
-            qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            
-            # 立即转换为QPixmap（这会复制数据，避免内存问题）
-            pixmap = QPixmap.fromImage(qt_image.copy())
-            
-            scaled_pixmap = pixmap.scaled(
-                self.video_label.size(),
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            self.video_label.setPixmap(scaled_pixmap)
+            self._show_frame(annotated_image)
             
             # 更新统计
             for det in detections:
-                if det.class_name_cn in self.behavior_stats:
-                    self.behavior_stats[det.class_name_cn] += 1
-                elif '使用电子设备' in det.class_name_cn:
-                    self.behavior_stats['使用电子设备'] += 1
+                if det.behavior_group in self.behavior_stats:
+                    self.behavior_stats[det.behavior_group] += 1
             
-            for i, (cls_id, info) in enumerate(BEHAVIOR_CLASSES.items()):
-                count = self.behavior_stats.get(info['cn_name'], 0)
-                self.stats_table.setItem(i, 1, QTableWidgetItem(str(count)))
+            self._update_stats_table()
             
             # 更新当前检测表
-            self.current_table.setRowCount(len(detections))
-            for i, det in enumerate(detections):
-                self.current_table.setItem(i, 0, QTableWidgetItem(det.class_name_cn))
-                self.current_table.setItem(i, 1, QTableWidgetItem(f"{det.confidence:.2f}"))
-                
-                type_item = QTableWidgetItem("⚠️ 预警" if det.behavior_type == 'warning' else "✅ 正常")
-                if det.behavior_type == 'warning':
-                    type_item.setForeground(QColor("#F56C6C"))
-                else:
-                    type_item.setForeground(QColor("#67C23A"))
-                self.current_table.setItem(i, 2, type_item)
+            self._update_current_table(detections)
             
             self.status_label.setText(f"检测完成: 发现 {len(detections)} 个行为")
             self.fps_label.setText("FPS: -")
@@ -1600,87 +2141,7 @@ class MainWindow(QMainWindow):
     
     def _detect_single_image(self, frame: np.ndarray) -> List[Detection]:
         """检测单张图片（复用检测线程的逻辑）"""
-        detections = []
-        person_boxes = []
-        
-        # 行为检测
-        if self.detection_thread.model is not None:
-            try:
-                results = self.detection_thread.model(
-                    frame, 
-                    conf=self.detection_thread.confidence_threshold, 
-                    iou=0.5, 
-                    verbose=False
-                )
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            cls_id = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            xyxy = box.xyxy[0].tolist()
-                            
-                            if cls_id in BEHAVIOR_CLASSES:
-                                class_info = BEHAVIOR_CLASSES[cls_id]
-                                detections.append(Detection(
-                                    class_id=cls_id,
-                                    class_name=class_info['name'],
-                                    class_name_cn=class_info['cn_name'],
-                                    confidence=conf,
-                                    bbox=xyxy,
-                                    behavior_type=class_info['type']
-                                ))
-            except Exception as e:
-                print(f"行为检测错误: {e}")
-        
-        # 电子设备检测
-        if self.detection_thread.device_model is not None:
-            try:
-                results = self.detection_thread.device_model(frame, conf=0.3, iou=0.5, verbose=False)
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            cls_id = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            xyxy = box.xyxy[0].tolist()
-                            
-                            if cls_id in ELECTRONIC_DEVICE_CLASSES:
-                                if not self.detection_thread._is_overlapping(xyxy, detections, threshold=0.3):
-                                    device_name = ELECTRONIC_DEVICE_CLASSES[cls_id]
-                                    detections.append(Detection(
-                                        class_id=5,
-                                        class_name='using_electronic_devices',
-                                        class_name_cn=f'使用电子设备({device_name})',
-                                        confidence=conf,
-                                        bbox=xyxy,
-                                        behavior_type='warning'
-                                    ))
-                            
-                            if cls_id == self.detection_thread.PERSON_CLASS_ID and conf > 0.4:
-                                person_boxes.append(xyxy)
-            except Exception as e:
-                print(f"电子设备检测错误: {e}")
-        
-        # 低头检测
-        if person_boxes and self.detection_thread.face_cascade is not None:
-            head_down_results = self.detection_thread._detect_head_down(frame, person_boxes, detections)
-            for hd in head_down_results:
-                if not self.detection_thread._is_overlapping(hd['bbox'], detections, threshold=0.3):
-                    head_down_class_info = BEHAVIOR_CLASSES[7]
-                    detections.append(Detection(
-                        class_id=7,
-                        class_name=head_down_class_info['name'],
-                        class_name_cn=head_down_class_info['cn_name'],
-                        confidence=hd['confidence'],
-                        bbox=hd['bbox'],
-                        behavior_type=head_down_class_info['type']
-                    ))
-        
-        # 去重
-        detections = self.detection_thread._remove_duplicate_detections(detections)
-        
-        return detections
+        return self.detection_thread._detect(frame)
     
     def take_screenshot(self):
         pixmap = self.video_label.pixmap()
@@ -1692,8 +2153,7 @@ class MainWindow(QMainWindow):
     
     def reset_stats(self):
         self.behavior_stats = {info['cn_name']: 0 for info in BEHAVIOR_CLASSES.values()}
-        for i in range(self.stats_table.rowCount()):
-            self.stats_table.setItem(i, 1, QTableWidgetItem("0"))
+        self._update_stats_table()
         
         # 重置去重统计
         self.detection_thread.reset_dedup_stats()
@@ -1703,6 +2163,8 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         self.detection_thread.stop()
+        # 检测线程结束时会话结束请求才入队，随后等待其与未发送的检测结果一并发出
+        self.detection_thread.shutdown()
         event.accept()
 
 
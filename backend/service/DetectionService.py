@@ -18,6 +18,12 @@ from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # 导入数据访问层组件
 from ..model.ManagerModel import DatabaseManager
 from ..model.ConfigModel import DatabaseConfig
@@ -51,6 +57,69 @@ ALERT_LEVELS = {
 }
 
 
+def _head_down_mask_loop(boxes: np.ndarray, existing: np.ndarray, img_h: int) -> np.ndarray:
+    """
+    低头候选框过滤（逐框循环版本，供Numba编译）
+    
+    Args:
+        boxes: 已裁剪到图像范围的人体框 (N, 4) int64
+        existing: 已检测行为框 (M, 4) int64
+        img_h: 图像高度
+        
+    Returns:
+        候选框掩码 (N,) bool
+    """
+    n = boxes.shape[0]
+    mask = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        x1, y1, x2, y2 = boxes[i, 0], boxes[i, 1], boxes[i, 2], boxes[i, 3]
+        if x2 <= x1 or y2 <= y1:
+            continue
+        person_height = y2 - y1
+        person_width = x2 - x1
+        # 只保留占图像30%以上的大目标
+        if person_height < img_h * 0.3 or person_height < 200 or person_width < 100:
+            continue
+        aspect_ratio = person_width / person_height
+        if aspect_ratio > 1.2 or aspect_ratio < 0.25:
+            continue
+        # 与已检测行为重叠超过15%则跳过
+        person_area = person_width * person_height
+        keep = True
+        for j in range(existing.shape[0]):
+            inter_w = min(x2, existing[j, 2]) - max(x1, existing[j, 0])
+            inter_h = min(y2, existing[j, 3]) - max(y1, existing[j, 1])
+            if inter_w > 0 and inter_h > 0 and inter_w * inter_h / person_area > 0.15:
+                keep = False
+                break
+        mask[i] = keep
+    return mask
+
+
+def _head_down_mask_numpy(boxes: np.ndarray, existing: np.ndarray, img_h: int) -> np.ndarray:
+    """低头候选框过滤（NumPy向量化版本，未安装Numba时使用），语义同 _head_down_mask_loop"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    person_height = y2 - y1
+    person_width = x2 - x1
+    mask = (x2 > x1) & (y2 > y1)
+    mask &= (person_height >= img_h * 0.3) & (person_height >= 200) & (person_width >= 100)
+    aspect_ratio = person_width / np.maximum(person_height, 1)
+    mask &= (aspect_ratio <= 1.2) & (aspect_ratio >= 0.25)
+    if existing.shape[0] and mask.any():
+        inter_w = np.minimum(x2[:, None], existing[None, :, 2]) - np.maximum(x1[:, None], existing[None, :, 0])
+        inter_h = np.minimum(y2[:, None], existing[None, :, 3]) - np.maximum(y1[:, None], existing[None, :, 1])
+        inter_area = np.where((inter_w > 0) & (inter_h > 0), inter_w * inter_h, 0)
+        person_area = np.maximum(person_width * person_height, 1)
+        mask &= ~(inter_area / person_area[:, None] > 0.15).any(axis=1)
+    return mask
+
+
+# 安装了Numba时编译逐框循环（首次调用编译并缓存到磁盘），否则使用向量化实现
+_head_down_candidate_mask = (
+    njit(cache=True)(_head_down_mask_loop) if NUMBA_AVAILABLE else _head_down_mask_numpy
+)
+
+
 @dataclass
 class Detection:
     """检测结果"""
@@ -244,11 +313,11 @@ class DetectionService(IDetectionService):
         self.device = self._get_device()  # 检测设备（GPU/CPU）
         self.time_tracker = BehaviorTimeTracker()  # 行为时间跟踪器
         
-        # 数据存储相关初始化
-        if db is None:
-            self.data_access = DetectionDataAccess(config=config)
-        else:
-            self.data_access = DetectionDataAccess(db=db)
+        # 数据存储相关初始化（延迟到首次访问，纯推理场景不连接数据库）
+        self._db = db
+        self._db_config = config
+        self._data_access: Optional[DetectionDataAccess] = None
+        self._data_access_lock = threading.Lock()
         
         # 当前会话状态
         self._current_session_id: Optional[int] = None
@@ -274,6 +343,18 @@ class DetectionService(IDetectionService):
         self._load_device_model()
         self._load_face_detector()
     
+    @property
+    def data_access(self) -> DetectionDataAccess:
+        """检测数据访问组合器（首次访问时创建连接池并初始化数据库）"""
+        if self._data_access is None:
+            with self._data_access_lock:
+                if self._data_access is None:
+                    if self._db is None:
+                        self._data_access = DetectionDataAccess(config=self._db_config)
+                    else:
+                        self._data_access = DetectionDataAccess(db=self._db)
+        return self._data_access
+    
     def _get_device(self) -> str:
         """获取最佳计算设备（优先使用GPU）"""
         try:
@@ -428,49 +509,20 @@ class DetectionService(IDetectionService):
                 if det.class_id in [0, 2, 3, 4, 5, 6]:
                     existing_boxes.append(det.bbox)
         
-        for person_box in person_boxes:
-            x1, y1, x2, y2 = [int(v) for v in person_box]
-            
-            x1 = max(0, x1)
-            y1 = max(0, y1)
-            x2 = min(w, x2)
-            y2 = min(h, y2)
-            
-            if x2 <= x1 or y2 <= y1:
-                continue
-            
+        if not person_boxes:
+            return head_down_detections
+        
+        # 裁剪到图像范围后，批量完成尺寸、长宽比与重叠过滤
+        boxes = np.asarray(person_boxes, dtype=np.float64).reshape(-1, 4).astype(np.int64)
+        boxes[:, 0] = np.maximum(boxes[:, 0], 0)
+        boxes[:, 1] = np.maximum(boxes[:, 1], 0)
+        boxes[:, 2] = np.minimum(boxes[:, 2], w)
+        boxes[:, 3] = np.minimum(boxes[:, 3], h)
+        existing = np.asarray(existing_boxes, dtype=np.float64).reshape(-1, 4).astype(np.int64)
+        candidates = boxes[_head_down_candidate_mask(boxes, existing, h)]
+        
+        for x1, y1, x2, y2 in candidates.tolist():
             person_height = y2 - y1
-            person_width = x2 - x1
-            
-            # 严格过滤：只检测占图像30%以上的大目标
-            if person_height < h * 0.3:
-                continue
-            
-            if person_height < 200 or person_width < 100:
-                continue
-            
-            aspect_ratio = person_width / person_height
-            if aspect_ratio > 1.2 or aspect_ratio < 0.25:
-                continue
-            
-            # 检查与已检测行为的重叠
-            skip_person = False
-            for eb in existing_boxes:
-                ex1, ey1, ex2, ey2 = [int(v) for v in eb]
-                inter_x1 = max(x1, ex1)
-                inter_y1 = max(y1, ey1)
-                inter_x2 = min(x2, ex2)
-                inter_y2 = min(y2, ey2)
-                
-                if inter_x2 > inter_x1 and inter_y2 > inter_y1:
-                    inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-                    person_area = (x2 - x1) * (y2 - y1)
-                    if inter_area / person_area > 0.15:
-                        skip_person = True
-                        break
-            
-            if skip_person:
-                continue
             
             # 检测人体上半部分的人脸
             head_y2 = y1 + int(person_height * 0.5)
@@ -1634,7 +1686,8 @@ class DetectionService(IDetectionService):
         """关闭服务"""
         if self._current_session_id:
             self.end_session(status='failed')
-        self.data_access.close()
+        if self._data_access is not None:
+            self._data_access.close()
     
     def __enter__(self) -> 'DetectionService':
         return self
@@ -44,7 +44,9 @@ def configure_default_services() -> ServiceContainer:
     from .ContainerService import get_container
     
     container = get_container()
-    register_services(container)
+    # 重复调用（如每次CLI命令）时不重复注册；服务实例均在首次获取时才创建
+    if not container.is_registered(IDetectionService):
+        register_services(container)
     
     return container
 